@@ -0,0 +1,319 @@
+"""API REST JSON (v1) asincrona per immobili e clienti.
+
+Gira su uno stack asincrono separato dall'applicazione Flask, cioè Quart con
+un pool di connessioni aiomysql, così una query lenta non occupa un thread
+del server. Dall'applicazione Flask riusa la configurazione (connessione.txt),
+la costruzione delle query di ricerca e paginazione, la validazione dei dati
+e la generazione dei codici.
+
+Avvio:  hypercorn api_async:app --bind 0.0.0.0:5001   (dipendenze in requirements.txt)
+
+Le scritture incrementano le versioni delle tabelle (version_bump_query)
+nella stessa transazione: è così che i processi Flask se ne accorgono,
+perché le loro cache in memoria sono indicizzate su quelle versioni (vedi
+shared_cache_key e cached_page). Le cache di questo processo non servono.
+
+Endpoint (risorsa = immobili | clienti):
+    GET    /api/v1/<risorsa>?search=&fields=a,b&limit=&page=&after=&<campo>=<valore>
+    GET    /api/v1/immobili?vicino=<luogo o lat,lon>&raggio=<km>   (oppure bbox=lat,lon,lat,lon)
+    GET    /api/v1/<risorsa>/<codice>?fields=a,b
+    POST   /api/v1/<risorsa>              crea (il codice viene generato)
+    PUT    /api/v1/<risorsa>/<codice>     sostituisce tutti i campi
+    PATCH  /api/v1/<risorsa>/<codice>     modifica solo i campi inviati
+    DELETE /api/v1/<risorsa>/<codice>
+
+PUT e PATCH con la versione letta (campo `versione` o intestazione If-Match
+con l'ETag del GET) modificano solo se nessun altro l'ha cambiata nel
+frattempo; altrimenti rispondono 409 con la versione attuale.
+
+Con `vicino` o `bbox` gli immobili sono ordinati dal più vicino e ogni
+elemento riporta anche la `distanza` in metri.
+"""
+import aiomysql
+from pymysql.constants import CLIENT
+from quart import Blueprint, Quart, jsonify, request
+
+import flask_app
+from flask_app import (BULK_TABLES, DB_CONFIG, IMMOBILI_FROM, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, POOL_DEFAULTS,
+                       clienti_count_query, clienti_page_query, immobili_count_query, immobili_page_query,
+                       change_log_query, client_unlink_query, deletion_log_query, normalize_record,
+                       parse_area, position_queries, version_bump_query)
+
+app = Quart(__name__)
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+RESOURCES = {
+    'immobili': {
+        'campi': {
+            'codice': 'i.codice', 'indirizzo': 'i.indirizzo', 'civico': 'i.civico', 'citta': 'i.citta',
+            'zona': 'i.zona', 'tipologia': 'i.tipologia', 'metratura': 'i.metratura',
+            'anno_incarico': 'i.anno_incarico', 'stato': 'i.stato', 'note': 'i.note',
+            'id_cliente': 'i.id_cliente', 'cliente_cognome': 'c.cognome', 'cliente_nome': 'c.nome',
+            'versione': 'i.versione',
+        },
+        # Campi sempre letti perché servono al cursore della paginazione keyset
+        'campi_cursore': ['codice'],
+        'filtri': {'tipologia': 'i.tipologia', 'stato': 'i.stato', 'citta': 'i.citta',
+                   'zona': 'i.zona', 'id_cliente': 'i.id_cliente'},
+        'da': IMMOBILI_FROM,
+        'chiave_sql': 'i.codice',
+        'pagina': lambda search, page, limit, after, filters, columns, area=None: immobili_page_query(
+            search, page, limit, after, filters, columns, key='codice', area=area),
+        'conteggio': immobili_count_query,
+        'posizioni': True,  # ricerca per distanza e coordinate aggiornate a ogni scrittura
+    },
+    'clienti': {
+        'campi': {
+            'id_cliente': 'id_cliente', 'cognome': 'cognome', 'nome': 'nome',
+            'codice_fiscale': 'codice_fiscale', 'partita_iva': 'partita_iva', 'telefono': 'telefono',
+            'email': 'email', 'indirizzo': 'indirizzo', 'citta': 'citta', 'cap': 'cap', 'note': 'note',
+            'versione': 'versione',
+        },
+        'campi_cursore': ['id_cliente', 'cognome', 'nome'],
+        'filtri': {'citta': 'citta', 'cap': 'cap'},
+        'da': 'FROM dbSistImm_Clienti',
+        'chiave_sql': 'id_cliente',
+        'pagina': clienti_page_query,
+        'conteggio': clienti_count_query,
+        'posizioni': False,
+    },
+}
+
+class ApiError(Exception):
+    """Errore restituito al client come JSON con il relativo codice HTTP"""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+@app.errorhandler(ApiError)
+async def handle_api_error(error):
+    return jsonify(error=str(error)), error.status
+
+@app.errorhandler(aiomysql.IntegrityError)
+async def handle_integrity_error(error):
+    return jsonify(error=f'Vincolo violato: {error}'), 409
+
+@app.errorhandler(aiomysql.MySQLError)
+async def handle_database_error(error):
+    return jsonify(error=f'Errore del database: {error}'), 500
+
+@app.before_serving
+async def create_pool():
+    """Carica la configurazione, verifica il database e crea il pool asincrono"""
+    flask_app.create_app()
+    settings = {key: int(DB_CONFIG.get(key, default)) for key, default in POOL_DEFAULTS.items()}
+    app.pool = await aiomysql.create_pool(
+        host=DB_CONFIG['HOST'],
+        port=int(DB_CONFIG['PORT']),
+        db=DB_CONFIG['DATABASE'],
+        user=DB_CONFIG['USERNAME'],
+        password=DB_CONFIG['PASSWORD'],
+        minsize=1,
+        maxsize=settings['POOL_SIZE'] + settings['POOL_MAX_OVERFLOW'],
+        pool_recycle=settings['POOL_IDLE_TIMEOUT'],
+        cursorclass=aiomysql.DictCursor,
+        autocommit=False,
+        # rowcount di UPDATE conta le righe trovate, anche se invariate
+        client_flag=CLIENT.FOUND_ROWS,
+    )
+
+@app.after_serving
+async def close_pool():
+    app.pool.close()
+    await app.pool.wait_closed()
+
+def get_resource(resource):
+    """Definizione della risorsa richiesta (404 se non esiste)"""
+    if resource not in RESOURCES:
+        raise ApiError(f"Risorsa sconosciuta: {resource}", 404)
+    return RESOURCES[resource], BULK_TABLES[resource]
+
+def selected_fields(spec):
+    """Campi richiesti con ?fields=a,b (tutti se assente)"""
+    fields = request.args.get('fields')
+    if not fields:
+        return list(spec['campi'])
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in spec['campi']]
+    if unknown:
+        raise ApiError(f"Campi sconosciuti: {', '.join(unknown)}", 400)
+    return fields
+
+def select_columns(spec, fields):
+    """Espressioni SQL per i campi richiesti più quelli necessari al cursore"""
+    names = fields + [field for field in spec['campi_cursore'] if field not in fields]
+    return ', '.join(f"{spec['campi'][name]} AS {name}" for name in names)
+
+async def fetch_one(spec, key, fields):
+    """Una riga della risorsa per chiave, o None"""
+    async with app.pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(f"SELECT {select_columns(spec, fields)} {spec['da']} "
+                                 f"WHERE {spec['chiave_sql']} = %s", (key,))
+            row = await cursor.fetchone()
+    return {field: row[field] for field in fields} if row else None
+
+@api_v1.route('/<resource>')
+async def list_resources(resource):
+    """Elenco paginato con ricerca full-text, filtri per campo e selezione dei campi"""
+    spec, _ = get_resource(resource)
+    fields = selected_fields(spec)
+    search_query = request.args.get('search', '').strip()
+    filters = {column: request.args[name] for name, column in spec['filtri'].items() if name in request.args}
+    page = max(request.args.get('page', 1, type=int) or 1, 1)
+    limit = min(max(request.args.get('limit', PAGE_SIZE_DEFAULT, type=int) or PAGE_SIZE_DEFAULT, 1), PAGE_SIZE_MAX)
+    after = request.args.get('after') or None
+    area, extra = None, {}
+    if spec['posizioni']:
+        try:
+            _, area = parse_area(request.args)
+        except ValueError as e:
+            raise ApiError(str(e), 400)
+        extra = {'area': area}
+
+    sql, params, cursor_fields = spec['pagina'](search_query, page, limit, after, filters,
+                                                select_columns(spec, fields), **extra)
+    async with app.pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(sql, params)
+            rows = await cursor.fetchall()
+            await cursor.execute(*spec['conteggio'](search_query, filters, **extra))
+            totale = (await cursor.fetchone())['totale']
+
+    rows, next_after = flask_app.page_result(list(rows), limit, cursor_fields)
+    if area is not None:
+        fields = fields + ['distanza']
+    return jsonify(
+        data=[{field: row[field] for field in fields} for row in rows],
+        paginazione={'page': page, 'limit': limit, 'totale': totale, 'next': next_after},
+    )
+
+@api_v1.route('/<resource>/<key>')
+async def get_resource_item(resource, key):
+    """Singolo immobile o cliente"""
+    spec, _ = get_resource(resource)
+    row = await fetch_one(spec, key, selected_fields(spec))
+    if row is None:
+        raise ApiError('Non trovato', 404)
+    response = jsonify(data=row)
+    if row.get('versione') is not None:
+        response.headers['ETag'] = f'"{row["versione"]}"'
+    return response
+
+async def request_record():
+    """Corpo JSON della richiesta (400 se assente o non è un oggetto)"""
+    body = await request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise ApiError('Il corpo della richiesta deve essere un oggetto JSON', 400)
+    return body
+
+def expected_version(record):
+    """Versione attesa dal client (campo `versione` o If-Match), o None per una modifica incondizionata"""
+    value = record.pop('versione', None)
+    if value is None and request.headers.get('If-Match'):
+        value = request.headers['If-Match'].strip().removeprefix('W/').strip('"')
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(f"Versione non valida: {value}", 400)
+
+def validate(bulk, record):
+    """Valida e normalizza i valori come l'importazione (422 se non validi)"""
+    try:
+        return normalize_record(bulk, record)
+    except ValueError as e:
+        raise ApiError(str(e), 422)
+
+async def allocate_code(conn, bulk):
+    """Nuovo codice dalla tabella delle sequenze, con un commit separato"""
+    async with conn.cursor() as cursor:
+        await cursor.execute('UPDATE dbSistImm_Sequenze SET valore = LAST_INSERT_ID(valore + 1) WHERE nome = %s',
+                             (bulk['codici'].sequence,))
+        await cursor.execute('SELECT LAST_INSERT_ID() AS valore')
+        number = (await cursor.fetchone())['valore']
+    await conn.commit()
+    return bulk['codici'].format(number)
+
+@api_v1.route('/<resource>', methods=['POST'])
+async def create_resource_item(resource):
+    """Crea un immobile o un cliente; il codice viene sempre generato"""
+    spec, bulk = get_resource(resource)
+    values = validate(bulk, dict(await request_record(), **{bulk['chiave']: None}))
+    columns = bulk['colonne']
+    async with app.pool.acquire() as conn:
+        values[bulk['chiave']] = await allocate_code(conn, bulk)
+        async with conn.cursor() as cursor:
+            await cursor.execute(f"INSERT INTO {bulk['tabella']} ({', '.join(columns)}) "
+                                 f"VALUES ({', '.join(['%s'] * len(columns))})",
+                                 [values[column] for column in columns])
+            await cursor.execute(*change_log_query(bulk['tabella'], values[bulk['chiave']], 'inserimento', 1,
+                                                   values, origin='api'))
+            if spec['posizioni']:
+                for query in position_queries(values):
+                    await cursor.execute(*query)
+            await cursor.execute(*version_bump_query(*bulk['tocca']))
+        await conn.commit()
+    return jsonify(data=await fetch_one(spec, values[bulk['chiave']], list(spec['campi']))), 201
+
+@api_v1.route('/<resource>/<key>', methods=['PUT', 'PATCH'])
+async def update_resource_item(resource, key):
+    """Sostituisce (PUT) o modifica parzialmente (PATCH) un immobile o un cliente"""
+    spec, bulk = get_resource(resource)
+    record = await request_record()
+    expected = expected_version(record)
+    if request.method == 'PATCH':
+        current = await fetch_one(spec, key, [column for column in bulk['colonne']])
+        if current is None:
+            raise ApiError('Non trovato', 404)
+        record = dict(current, **record)
+    values = validate(bulk, dict(record, **{bulk['chiave']: key}))
+    columns = [column for column in bulk['colonne'] if column != bulk['chiave']]
+    params = [values[column] for column in columns] + [key]
+    condition = f"{bulk['chiave']} = %s"
+    if expected is not None:
+        condition += ' AND versione = %s'
+        params.append(expected)
+    async with app.pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            await cursor.execute(f"UPDATE {bulk['tabella']} SET {', '.join(f'{column} = %s' for column in columns)}, "
+                                 f"versione = versione + 1 WHERE {condition}", params)
+            found = cursor.rowcount
+            if found:
+                await cursor.execute(f"SELECT versione FROM {bulk['tabella']} WHERE {bulk['chiave']} = %s", (key,))
+                version = (await cursor.fetchone())['versione']
+                await cursor.execute(*change_log_query(bulk['tabella'], key, 'modifica', version, values, origin='api'))
+                if spec['posizioni']:
+                    for query in position_queries(values):
+                        await cursor.execute(*query)
+                await cursor.execute(*version_bump_query(*bulk['tocca']))
+                await conn.commit()
+            else:
+                await conn.rollback()
+    if not found:
+        current = await fetch_one(spec, key, list(spec['campi']))
+        if current is None:
+            raise ApiError('Non trovato', 404)
+        return jsonify(error=f"Modificato da altri: la versione attuale è {current['versione']}", data=current), 409
+    return jsonify(data=await fetch_one(spec, key, list(spec['campi'])))
+
+@api_v1.route('/<resource>/<key>', methods=['DELETE'])
+async def delete_resource_item(resource, key):
+    """Elimina un immobile o un cliente"""
+    _, bulk = get_resource(resource)
+    async with app.pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            if bulk['tabella'] == 'dbSistImm_Clienti':
+                await cursor.execute(*client_unlink_query(key))
+            await cursor.execute(*deletion_log_query(bulk, key, origin='api'))
+            await cursor.execute(f"DELETE FROM {bulk['tabella']} WHERE {bulk['chiave']} = %s", (key,))
+            deleted = cursor.rowcount
+            await cursor.execute(*version_bump_query(*bulk['tocca']))
+        await conn.commit()
+    if not deleted:
+        raise ApiError('Non trovato', 404)
+    return '', 204
+
+app.register_blueprint(api_v1)
@@ -0,0 +1,333 @@
+"""Benchmark riproducibile dell'applicazione su un database MySQL/MariaDB locale.
+
+Le query usano funzioni specifiche di MySQL (MATCH ... AGAINST,
+LAST_INSERT_ID, indici FULLTEXT), quindi serve un'istanza MySQL o MariaDB
+locale invece di un database SQLite. Il database di prova si indica con un
+file nello stesso formato di connessione.txt.
+
+Popolamento con dati sintetici (sempre uguali a parità di --seed):
+    python benchmark/load_test.py seed --config connessione_benchmark.txt --immobili 100000 --clienti 20000
+
+Misura in-process con il test client di Flask, oppure via HTTP su un server avviato:
+    python benchmark/load_test.py run --config connessione_benchmark.txt --requests 500 --concurrency 16
+    python benchmark/load_test.py run --config connessione_benchmark.txt --url http://127.0.0.1:8000
+
+Con --save-baseline i risultati diventano il riferimento; le esecuzioni
+successive segnalano le regressioni di p95 o throughput oltre --tolerance.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import flask_app  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmark', 'baseline.json')
+MEMORY_SAMPLES = 3
+
+COGNOMI = ['Rossi', 'Russo', 'Ferrari', 'Esposito', 'Bianchi', 'Romano', 'Colombo', 'Ricci', 'Marino',
+           'Greco', 'Bruno', 'Gallo', 'Conti', 'De Luca', 'Mancini', 'Costa', 'Giordano', 'Rizzo',
+           'Lombardi', 'Moretti', 'Barbieri', 'Fontana', 'Santoro', 'Mariani', 'Rinaldi', 'Caruso']
+NOMI = ['Marco', 'Giulia', 'Luca', 'Francesca', 'Andrea', 'Chiara', 'Matteo', 'Sara', 'Alessandro',
+        'Valentina', 'Davide', 'Martina', 'Simone', 'Elena', 'Federico', 'Laura', 'Paolo', 'Anna']
+CITTA = {
+    'Milano': ['Centro', 'Navigli', 'Isola', 'Città Studi', 'Lambrate', 'Bicocca'],
+    'Roma': ['Centro Storico', 'Prati', 'Trastevere', 'EUR', 'Monteverde', 'San Giovanni'],
+    'Torino': ['Centro', 'Crocetta', 'San Salvario', 'Vanchiglia', 'Lingotto'],
+    'Bologna': ['Centro', 'Santo Stefano', 'Navile', 'Saragozza'],
+    'Napoli': ['Chiaia', 'Vomero', 'Posillipo', 'Centro'],
+    'Firenze': ['Centro', 'Campo di Marte', 'Novoli', 'Gavinana'],
+}
+VIE = ['Via Roma', 'Via Garibaldi', 'Via Mazzini', 'Corso Italia', 'Via Dante', 'Viale Europa',
+       'Via Verdi', 'Piazza della Repubblica', 'Via Manzoni', 'Corso Vittorio Emanuele']
+TIPOLOGIE = ['Abitativo', 'Abitativo', 'Abitativo', 'Commerciale', 'Ufficio', 'Box', 'Magazzino', 'Altro']
+STATI = ['Attivo', 'Disponibile', 'Disponibile', 'Venduto', 'Affittato', 'Chiuso']
+
+# POPOLAMENTO
+
+def synthetic_clienti(count, rng):
+    """Genera i clienti uno alla volta, senza tenerli in memoria"""
+    for number in range(1, count + 1):
+        cognome, nome = rng.choice(COGNOMI), rng.choice(NOMI)
+        citta = rng.choice(list(CITTA))
+        yield {
+            'id_cliente': f'SIC{number:04d}',
+            'cognome': cognome,
+            'nome': nome,
+            'codice_fiscale': ''.join(rng.choice('ABCDEFGHLMNPRSTVZ0123456789') for _ in range(16)),
+            'partita_iva': ''.join(rng.choice('0123456789') for _ in range(11)) if rng.random() < 0.2 else None,
+            'telefono': f'3{rng.randint(10, 99)} {rng.randint(1000000, 9999999)}',
+            'email': f"{nome.lower()}.{cognome.lower().replace(' ', '')}{number}@esempio.it",
+            'indirizzo': f'{rng.choice(VIE)} {rng.randint(1, 200)}',
+            'citta': citta,
+            'cap': f'{rng.randint(10, 99)}100',
+        }
+
+def synthetic_immobili(count, clienti, rng):
+    """Genera gli immobili uno alla volta, associati a clienti esistenti"""
+    for number in range(1, count + 1):
+        citta = rng.choice(list(CITTA))
+        yield {
+            'codice': f'SI{number:04d}',
+            'indirizzo': rng.choice(VIE),
+            'civico': str(rng.randint(1, 200)),
+            'citta': citta,
+            'zona': rng.choice(CITTA[citta]),
+            'tipologia': rng.choice(TIPOLOGIE),
+            'metratura': round(rng.uniform(20, 300), 1),
+            'anno_incarico': rng.randint(2000, 2026),
+            'stato': rng.choice(STATI),
+            'id_cliente': f'SIC{rng.randint(1, clienti):04d}' if clienti and rng.random() < 0.8 else None,
+        }
+
+def seed(args):
+    """Crea lo schema, applica le migrazioni e inserisce i dati sintetici"""
+    # La migrazione 000 crea le tabelle se il database è vuoto
+    if not flask_app.apply_migrations():
+        sys.exit(1)
+    if args.reset:
+        conn = flask_app.get_db_connection()
+        if conn is None:
+            sys.exit("Impossibile connettersi al database di prova")
+        try:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM dbSistImm_Immobili')
+            cursor.execute('DELETE FROM dbSistImm_Clienti')
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    rng = random.Random(args.seed)
+    for nome, records in (('clienti', synthetic_clienti(args.clienti, rng)),
+                          ('immobili', synthetic_immobili(args.immobili, args.clienti, rng))):
+        start = time.perf_counter()
+        report = flask_app.import_records(nome, records)
+        print(f"{nome}: {report['importate']} righe in {time.perf_counter() - start:.1f} s, "
+              f"errori: {report['totale_errori']}")
+
+# SCENARI
+
+def sample_rows(sql, size, seed):
+    """Campione riproducibile di righe esistenti da usare nelle richieste di modifica"""
+    conn = flask_app.get_db_connection()
+    if conn is None:
+        sys.exit("Impossibile connettersi al database di prova")
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(f'{sql} ORDER BY RAND(%s) LIMIT %s', (seed, size))
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+def build_scenarios(seed):
+    """Richieste per endpoint: ogni scenario produce (metodo, percorso, dati) a partire dall'indice"""
+    immobili = sample_rows('SELECT codice AS id, indirizzo, civico, citta, zona, tipologia, metratura, '
+                           'anno_incarico, stato, note AS descrizione, id_cliente, versione FROM dbSistImm_Immobili', 200, seed)
+    clienti = sample_rows('SELECT id_cliente AS id, cognome, nome, codice_fiscale, partita_iva, telefono, '
+                          'email, indirizzo, citta, cap, note, versione FROM dbSistImm_Clienti', 200, seed)
+    if not immobili or not clienti:
+        sys.exit("Database di prova vuoto: eseguire prima il comando seed")
+    termini_immobili = list(CITTA) + [zona for zone in CITTA.values() for zona in zone] + COGNOMI
+    termini_clienti = COGNOMI + NOMI + list(CITTA)
+    # Luoghi presenti nel gazzetteer di data/ (zone e città dei dati sintetici)
+    luoghi = list(CITTA) + [f'{zona}, {citta}' for citta, zone in CITTA.items() for zona in zone]
+
+    def pick(values, index):
+        # Sequenza fissa ma sparsa sui valori del campione
+        return values[(index * 7919) % len(values)]
+
+    versions_lock = threading.Lock()
+
+    def form(row):
+        # Ogni salvataggio incrementa la versione della riga (concorrenza ottimistica):
+        # il form successivo per la stessa riga deve riportare quella nuova
+        with versions_lock:
+            data = {key: '' if value is None else str(value) for key, value in row.items()}
+            row['versione'] += 1
+        return data
+
+    return {
+        'dashboard': lambda i: ('GET', '/', None),
+        'immobili_lista': lambda i: ('GET', '/immobili', None),
+        'immobili_ricerca': lambda i: ('GET', '/immobili?' + urllib.parse.urlencode(
+            {'search': pick(termini_immobili, i)}), None),
+        'immobili_vicino': lambda i: ('GET', '/immobili?' + urllib.parse.urlencode(
+            {'vicino': pick(luoghi, i), 'raggio': 2}), None),
+        'clienti_ricerca': lambda i: ('GET', '/clienti?' + urllib.parse.urlencode(
+            {'search': pick(termini_clienti, i)}), None),
+        'modifica_immobile': lambda i: ('GET', f"/modifica_immobile/{pick(immobili, i)['id']}", None),
+        'modifica_cliente': lambda i: ('GET', f"/modifica_cliente/{pick(clienti, i)['id']}", None),
+        'salva_immobile': lambda i: ('POST', '/salva_immobile', form(pick(immobili, i))),
+        'salva_cliente': lambda i: ('POST', '/salva_cliente', form(pick(clienti, i))),
+    }
+
+# ESECUZIONE
+
+def client_sender(app):
+    """Invia le richieste in-process con un test client Flask per thread"""
+    local = threading.local()
+
+    def send(method, path, data):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        return local.client.open(path, method=method, data=data).status_code
+    return send
+
+def http_sender(base_url):
+    """Invia le richieste via HTTP a un server già avviato (redirect non seguiti)"""
+    class NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+    opener = urllib.request.build_opener(NoRedirect)
+
+    def send(method, path, data):
+        body = urllib.parse.urlencode(data).encode('utf-8') if data is not None else None
+        try:
+            with opener.open(urllib.request.Request(base_url + path, data=body, method=method), timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    return send
+
+def percentile(sorted_values, fraction):
+    """Percentile con il metodo nearest-rank"""
+    index = max(int(round(fraction * len(sorted_values))) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+def measure(scenario, send, requests, concurrency, track_memory):
+    """Esegue lo scenario e restituisce latenze, throughput, errori e memoria.
+
+    I 409 non sono errori: due salvataggi concorrenti della stessa riga
+    portano la stessa versione e il secondo viene respinto dalla concorrenza
+    ottimistica, come previsto. Sono contati a parte come conflitti.
+    """
+    def one(index):
+        start = time.perf_counter()
+        status = send(*scenario(index))
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    result = {
+        'richieste': requests,
+        'errori': sum(1 for _, status in results if status >= 400 and status != 409),
+        'conflitti': sum(1 for _, status in results if status == 409),
+        'throughput': requests / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'memoria_kib': None,
+    }
+    if track_memory:
+        # Picco di memoria Python allocata durante una singola richiesta
+        peaks = []
+        for index in range(MEMORY_SAMPLES):
+            tracemalloc.start()
+            send(*scenario(index))
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        result['memoria_kib'] = max(peaks) / 1024
+    return result
+
+def compare(results, baseline, tolerance):
+    """Confronta con il riferimento e restituisce le regressioni trovate"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get('risultati', {}).get(name)
+        if reference is None:
+            continue
+        if result['p95_ms'] > reference['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {reference['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+        if result['throughput'] < reference['throughput'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {reference['throughput']:.1f} -> {result['throughput']:.1f} req/s")
+    return regressions
+
+def run(args):
+    """Misura tutti gli scenari richiesti e confronta con il riferimento"""
+    scenarios = build_scenarios(args.seed)
+    names = args.only or list(scenarios)
+    if args.url:
+        send, track_memory = http_sender(args.url.rstrip('/')), False
+    else:
+        send, track_memory = client_sender(flask_app.app), True
+
+    results = {}
+    print(f"{'endpoint':<20}{'errori':>8}{'409':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mem KiB':>10}")
+    for name in names:
+        measure(scenarios[name], send, min(args.requests, 20), args.concurrency, False)  # riscaldamento
+        result = results[name] = measure(scenarios[name], send, args.requests, args.concurrency, track_memory)
+        memoria = f"{result['memoria_kib']:.0f}" if result['memoria_kib'] is not None else '-'
+        print(f"{name:<20}{result['errori']:>8}{result['conflitti']:>6}{result['throughput']:>10.1f}{result['p50_ms']:>10.1f}"
+              f"{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}{memoria:>10}")
+
+    meta = {'modalita': 'http' if args.url else 'test_client', 'richieste': args.requests,
+            'concorrenza': args.concurrency, 'seed': args.seed}
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump({'meta': meta, 'risultati': results}, file, indent=2)
+        print(f"Riferimento salvato in {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline.get('meta') != meta:
+            print(f"Attenzione: riferimento misurato con parametri diversi: {baseline.get('meta')}")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSIONE {regression}")
+        if regressions:
+            sys.exit(1)
+        print("Nessuna regressione rispetto al riferimento")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--config', default=os.path.join(ROOT, 'connessione.txt'),
+                        help='file di connessione al database di prova')
+    parser.add_argument('--seed', type=int, default=42)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help='popola il database con dati sintetici')
+    seed_parser.add_argument('--immobili', type=int, default=10000)
+    seed_parser.add_argument('--clienti', type=int, default=2000)
+    seed_parser.add_argument('--reset', action='store_true', help='svuota le tabelle prima di popolarle')
+
+    run_parser = commands.add_parser('run', help='esegue il benchmark')
+    run_parser.add_argument('--url', help='URL di un server già avviato (predefinito: test client in-process)')
+    run_parser.add_argument('--requests', type=int, default=200, help='richieste per endpoint')
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--only', nargs='+', help='endpoint da misurare')
+    run_parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    run_parser.add_argument('--save-baseline', action='store_true')
+    run_parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='peggioramento relativo oltre il quale segnalare una regressione')
+
+    args = parser.parse_args()
+    if args.command == 'seed':
+        # Le tabelle potrebbero non esistere ancora: niente verifica iniziale
+        flask_app.load_db_config(args.config)
+        seed(args)
+    else:
+        flask_app.create_app(args.config)
+        run(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Confronta il throughput del server di sviluppo Flask con gunicorn.
+
+Avvia a turno `python flask_app.py` (server Werkzeug in debug) e
+`gunicorn -c gunicorn.conf.py wsgi:app`, invia le stesse richieste con
+lo stesso livello di concorrenza e stampa richieste al secondo e latenze.
+Richiede connessione.txt con un database raggiungibile e gunicorn installato.
+
+Uso: python benchmark/wsgi_throughput.py --path /immobili --requests 2000 --concurrency 32
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def wait_until_ready(url, timeout=30):
+    """Attende che il server risponda"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Il server su {url} non risponde")
+
+def run_load(url, requests, concurrency):
+    """Invia `requests` richieste GET con `concurrency` client paralleli"""
+    def fetch(_):
+        start = time.perf_counter()
+        with urllib.request.urlopen(url, timeout=30) as response:
+            response.read()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(executor.map(fetch, range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        'throughput': requests / elapsed,
+        'p50': latencies[len(latencies) // 2] * 1000,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+def benchmark(name, command, url, args):
+    """Avvia il server, lo scalda, misura e lo arresta"""
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    try:
+        wait_until_ready(url)
+        run_load(url, min(args.requests, 100), args.concurrency)
+        result = run_load(url, args.requests, args.concurrency)
+        print(f"{name:<12} {result['throughput']:>10.1f} req/s   "
+              f"p50 {result['p50']:>8.1f} ms   p95 {result['p95']:>8.1f} ms")
+    finally:
+        # Il reloader di Flask e i worker di gunicorn sono nello stesso gruppo di processi
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', default='/immobili')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    benchmark('sviluppo', [sys.executable, 'flask_app.py'], f'http://127.0.0.1:5000{args.path}', args)
+    benchmark('gunicorn', ['gunicorn', '-c', 'gunicorn.conf.py', '--workers', str(args.workers),
+                           '--bind', '127.0.0.1:8000', '--access-logfile', '/dev/null', 'wsgi:app'],
+              f'http://127.0.0.1:8000{args.path}', args)
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,37 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import (Flask, render_template, request, redirect, url_for, flash, jsonify, g, has_request_context,
+                   Response, stream_with_context, before_render_template, template_rendered, session,
+                   make_response, get_flashed_messages, send_from_directory)
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.errors import PoolError
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from decimal import Decimal
+from markupsafe import Markup
+import base64
+import bisect
+import csv
+import functools
+import gzip
+import hashlib
+import io
+import json
+import math
+import mimetypes
+import re
+import threading
+import time
 import os
+import sys
+import unicodedata
+import urllib.request
+import uuid
+
+try:
+    import brotli
+except ImportError:  # La compressione brotli è facoltativa (pip install brotli)
+    brotli = None
 
 app = Flask(__name__)
 app.secret_key = 'chiave_segreta_per_flash_messages'  # Necessaria per i flash messages
@@ -9,11 +39,11 @@ app.secret_key = 'chiave_segreta_per_flash_messages'  # Necessaria per i flash m
 # Configurazione del database
 DB_CONFIG = {}
 
-def load_db_config():
+def load_db_config(path='connessione.txt'):
     """Carica la configurazione del database dal file connessione.txt"""
     global DB_CONFIG
     try:
-        with open('connessione.txt', 'r', encoding='utf-8') as file:
+        with open(path, 'r', encoding='utf-8') as file:
             for line in file:
                 line = line.strip()
                 # Ignora righe vuote e commenti
@@ -26,21 +56,709 @@ def load_db_config():
         print("Crea il file con i parametri di connessione MySQL")
         exit(1)
 
-def get_db_connection():
-    """Crea una connessione al database MySQL"""
+def missing_db_config():
+    """Parametri obbligatori assenti dal file connessione.txt"""
+    required_keys = ['HOST', 'PORT', 'DATABASE', 'USERNAME', 'PASSWORD']
+    return [key for key in required_keys if key not in DB_CONFIG]
+
+# ACCESSO AI DATI
+
+PREPARED_CACHE_SIZE = 64  # istruzioni preparate tenute aperte per ogni connessione
+
+class RecordMixin:
+    """Accesso ai campi anche per nome (riga['campo']), come con i cursori dictionary=True"""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+@functools.lru_cache(maxsize=256)
+def record_type(columns):
+    """Tipo di riga per un elenco di colonne: una tupla con nomi, senza dizionario per ogni riga"""
+    return type('Riga', (RecordMixin, namedtuple('Riga', columns, rename=True)), {'__slots__': ()})
+
+def to_records(cursor, rows):
+    """Converte le righe (tuple) lette da `cursor` in record con i nomi delle colonne"""
+    if cursor.description is None:
+        return []
+    make = record_type(tuple(column[0] for column in cursor.description))._make
+    return [make(row) for row in rows]
+
+class StatementCache:
+    """Istruzioni preparate sul server, tenute aperte per tutta la vita di una connessione del pool.
+
+    Ogni istruzione ha il proprio cursore preparato: rieseguirla invia solo
+    i parametri, senza un nuovo parsing. Oltre PREPARED_CACHE_SIZE istruzioni
+    viene chiusa quella usata meno di recente.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursors = OrderedDict()  # sql -> (sql, cursore)
+
+    def cursor(self, sql):
+        """Coppia (sql, cursore preparato); il cursore riconosce l'istruzione dallo stesso oggetto sql"""
+        entry = self._cursors.get(sql)
+        if entry is not None:
+            self._cursors.move_to_end(sql)
+            return entry
+        entry = self._cursors[sql] = (sql, InstrumentedCursor(self.connection.cursor(prepared=True)))
+        while len(self._cursors) > PREPARED_CACHE_SIZE:
+            _, (_, cursor) = self._cursors.popitem(last=False)
+            self._close(cursor)
+        return entry
+
+    def discard(self, sql):
+        """Chiude l'istruzione dopo un errore: verrà preparata di nuovo"""
+        entry = self._cursors.pop(sql, None)
+        if entry is not None:
+            self._close(entry[1])
+
+    def _close(self, cursor):
+        try:
+            cursor.close()
+        except Error:
+            pass
+
+# Parametri del pool di connessioni (sovrascrivibili in connessione.txt)
+POOL_DEFAULTS = {
+    'POOL_SIZE': 5,             # connessioni mantenute aperte
+    'POOL_MAX_OVERFLOW': 10,    # connessioni extra consentite nei picchi
+    'POOL_IDLE_TIMEOUT': 300,   # secondi dopo i quali una connessione inattiva viene chiusa
+    'POOL_TIMEOUT': 30,         # secondi di attesa massima per ottenere una connessione
+}
+
+class PooledConnection:
+    """Connessione presa in prestito dal pool: close() la restituisce invece di chiuderla"""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs))
+
+    def query(self, sql, params=()):
+        """Righe di una SELECT come record leggeri, con un'istruzione preparata riusata tra le richieste.
+
+        Con PREPARED_STATEMENTS=0 in connessione.txt usa il protocollo testuale.
+        """
+        if DB_CONFIG.get('PREPARED_STATEMENTS', '1') != '1':
+            cursor = self.cursor()
+            try:
+                cursor.execute(sql, params)
+                return to_records(cursor, cursor.fetchall())
+            finally:
+                cursor.close()
+        
+        cache = getattr(self._connection, 'statement_cache', None)
+        if cache is None:
+            cache = self._connection.statement_cache = StatementCache(self._connection)
+        sql, cursor = cache.cursor(sql)
+        try:
+            cursor.execute(sql, tuple(params))
+            return to_records(cursor, cursor.fetchall())
+        except Error:
+            cache.discard(sql)
+            raise
+
+    def query_batch(self, statements):
+        """Esegue più SELECT, date come coppie (sql, parametri), in un solo viaggio verso il server.
+
+        Restituisce le righe di ogni istruzione, nello stesso ordine.
+        """
+        cursor = self.cursor()
+        try:
+            cursor.execute(';\n'.join(sql for sql, _ in statements),
+                           [param for _, params in statements for param in params])
+            results = [to_records(cursor, cursor.fetchall())]
+            while cursor.nextset():
+                results.append(to_records(cursor, cursor.fetchall()))
+            return results
+        finally:
+            cursor.close()
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._connection)
+
+class ConnectionPool:
+    """Pool limitato di connessioni MySQL con overflow, scadenza per inattività e validazione"""
+
+    def __init__(self, connect_args, size, max_overflow, idle_timeout, timeout):
+        self.connect_args = connect_args
+        self.size = size
+        self.max_overflow = max_overflow
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = deque()  # coppie (connessione, istante di rilascio)
+        self._aperte = 0
+        self._in_uso = 0
+        self._cond = threading.Condition()
+        self._stats = {'attese': 0, 'timeout': 0, 'create': 0, 'riconnessioni': 0, 'scartate': 0}
+
+    def _scarta(self, connection):
+        """Chiude una connessione non più utilizzabile (da chiamare senza lock)"""
+        try:
+            connection.close()
+        except Error:
+            pass
+
+    def acquire(self):
+        """Restituisce una connessione valida, attendendo se il pool è esaurito"""
+        scadenza = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                connection = None
+                scadute = []
+                while self._idle:
+                    candidata, rilasciata = self._idle.pop()
+                    if time.monotonic() - rilasciata > self.idle_timeout:
+                        scadute.append(candidata)
+                        self._aperte -= 1
+                        continue
+                    connection = candidata
+                    break
+                if connection is not None or self._aperte < self.size + self.max_overflow:
+                    if connection is None:
+                        self._aperte += 1
+                    self._in_uso += 1
+                    break
+                # Pool esaurito: attende che una connessione venga restituita
+                self._stats['attese'] += 1
+                rimanente = scadenza - time.monotonic()
+                if rimanente <= 0 or not self._cond.wait(rimanente):
+                    self._stats['timeout'] += 1
+                    raise PoolError(f"Nessuna connessione disponibile entro {self.timeout} secondi")
+
+        for scaduta in scadute:
+            self._scarta(scaduta)
+        try:
+            return self._valida(connection)
+        except Error:
+            with self._cond:
+                self._aperte -= 1
+                self._in_uso -= 1
+                self._cond.notify()
+            raise
+
+    def _valida(self, connection):
+        """Verifica la connessione al checkout, riconnettendo se è caduta"""
+        if connection is None:
+            connection = mysql.connector.connect(**self.connect_args)
+            with self._cond:
+                self._stats['create'] += 1
+            return connection
+        try:
+            connection.ping(reconnect=False)
+            return connection
+        except Error:
+            self._scarta(connection)
+            connection = mysql.connector.connect(**self.connect_args)
+            with self._cond:
+                self._stats['riconnessioni'] += 1
+            return connection
+
+    def release(self, connection):
+        """Riporta una connessione nel pool, annullando eventuali transazioni lasciate aperte"""
+        riutilizzabile = False
+        try:
+            if connection.is_connected():
+                connection.rollback()
+                riutilizzabile = True
+        except Error:
+            pass
+
+        with self._cond:
+            self._in_uso -= 1
+            # Le connessioni di overflow e quelle rotte non tornano nel pool
+            if riutilizzabile and len(self._idle) + self._in_uso < self.size:
+                self._idle.append((connection, time.monotonic()))
+                connection = None
+            else:
+                self._aperte -= 1
+                self._stats['scartate'] += 1
+            self._cond.notify()
+
+        if connection is not None:
+            self._scarta(connection)
+
+    def stats(self):
+        """Statistiche correnti del pool"""
+        with self._cond:
+            return dict(self._stats,
+                        dimensione=self.size,
+                        overflow_massimo=self.max_overflow,
+                        aperte=self._aperte,
+                        in_uso=self._in_uso,
+                        inattive=len(self._idle))
+
+_pool = None
+_replicas = None
+_pool_lock = threading.Lock()
+
+def new_pool(host, port, **connect_args):
+    """Pool di connessioni verso `host`, con database, credenziali e limiti da connessione.txt"""
+    settings = {key: int(DB_CONFIG.get(key, default)) for key, default in POOL_DEFAULTS.items()}
+    return ConnectionPool(
+        connect_args=dict({
+            'host': host,
+            'port': int(port),
+            'database': DB_CONFIG['DATABASE'],
+            'user': DB_CONFIG['USERNAME'],
+            'password': DB_CONFIG['PASSWORD'],
+        }, **connect_args),
+        size=settings['POOL_SIZE'],
+        max_overflow=settings['POOL_MAX_OVERFLOW'],
+        idle_timeout=settings['POOL_IDLE_TIMEOUT'],
+        timeout=settings['POOL_TIMEOUT'],
+    )
+
+def get_pool():
+    """Crea il pool del server primario al primo utilizzo, dopo che la configurazione è stata caricata"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = new_pool(DB_CONFIG['HOST'], DB_CONFIG['PORT'])
+    return _pool
+
+# REPLICHE IN SOLA LETTURA
+
+# Parametri delle repliche (sovrascrivibili in connessione.txt), ad esempio
+# READ_REPLICAS=db-replica1:3306, db-replica2:3306
+REPLICA_DEFAULTS = {
+    'REPLICA_STICKY_SECONDS': 10,   # dopo una scrittura la sessione legge dal primario per questi secondi
+    'REPLICA_RETRY_SECONDS': 30,    # pausa prima di riprovare una replica non raggiungibile o in ritardo
+    'REPLICA_MAX_LAG': 5,           # ritardo massimo di replicazione accettato, in secondi
+    'REPLICA_CHECK_INTERVAL': 10,   # ogni quanti secondi verificare il ritardo di una replica
+    'REPLICA_CONNECT_TIMEOUT': 3,   # secondi per aprire una connessione verso una replica
+}
+
+def replica_setting(key):
+    return int(DB_CONFIG.get(key, REPLICA_DEFAULTS[key]))
+
+class Replica:
+    """Replica in sola lettura con il proprio pool e lo stato di salute"""
+
+    def __init__(self, host, port):
+        self.name = f'{host}:{port}'
+        self.pool = new_pool(host, port, connection_timeout=replica_setting('REPLICA_CONNECT_TIMEOUT'))
+        self.down_until = 0.0       # istante (monotonic) fino al quale la replica è esclusa
+        self.next_check = 0.0       # istante della prossima verifica del ritardo
+        self.lag_check = True       # disattivata se l'utente non ha i privilegi per leggerlo
+        self.lag = None
+
+class ReplicaSet:
+    """Distribuisce le letture tra le repliche sane, preferendo quella con meno connessioni in uso.
+
+    Una replica che non risponde, o il cui ritardo supera REPLICA_MAX_LAG,
+    viene esclusa per REPLICA_RETRY_SECONDS; se nessuna è disponibile la
+    lettura passa al primario.
+    """
+
+    def __init__(self, addresses):
+        self.replicas = [Replica(*address) for address in addresses]
+        self._turn = 0
+        self._lock = threading.Lock()
+
+    def _candidates(self):
+        now = time.monotonic()
+        with self._lock:
+            self._turn += 1
+            healthy = [replica for replica in self.replicas if replica.down_until <= now]
+            if not healthy:
+                return []
+            # A parità di connessioni in uso la rotazione alterna le repliche
+            start = self._turn % len(healthy)
+            healthy = healthy[start:] + healthy[:start]
+        return sorted(healthy, key=lambda replica: replica.pool.stats()['in_uso'])
+
+    def _mark_down(self, replica, reason):
+        with self._lock:
+            replica.down_until = time.monotonic() + replica_setting('REPLICA_RETRY_SECONDS')
+        app.logger.warning(f"Replica {replica.name} esclusa: {reason}")
+
+    def _lag_ok(self, replica, connection):
+        """Verifica periodica del ritardo di replicazione (al massimo un thread per volta)"""
+        now = time.monotonic()
+        with self._lock:
+            if not replica.lag_check or now < replica.next_check:
+                return True
+            replica.next_check = now + replica_setting('REPLICA_CHECK_INTERVAL')
+        cursor = connection.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute('SHOW REPLICA STATUS')
+            except Error:
+                cursor.execute('SHOW SLAVE STATUS')  # MySQL precedente alla 8.0.22
+            status = cursor.fetchone()
+        except Error as e:
+            replica.lag_check = False
+            app.logger.warning(f"Ritardo della replica {replica.name} non verificabile: {e}")
+            return True
+        finally:
+            cursor.close()
+        if status is None:
+            return True
+        replica.lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        if replica.lag is None:
+            self._mark_down(replica, 'replicazione ferma')
+            return False
+        if replica.lag > replica_setting('REPLICA_MAX_LAG'):
+            self._mark_down(replica, f'ritardo di {replica.lag} secondi')
+            return False
+        return True
+
+    def acquire(self):
+        """Coppia (pool, connessione) di una replica sana, oppure (None, None)"""
+        for replica in self._candidates():
+            try:
+                connection = replica.pool.acquire()
+            except Error as e:
+                self._mark_down(replica, e)
+                continue
+            if self._lag_ok(replica, connection):
+                return replica.pool, connection
+            replica.pool.release(connection)
+        return None, None
+
+    def stats(self):
+        """Statistiche del pool e stato di ogni replica"""
+        now = time.monotonic()
+        return {replica.name: dict(replica.pool.stats(), disponibile=replica.down_until <= now, ritardo=replica.lag)
+                for replica in self.replicas}
+
+def parse_replicas(value):
+    """Indirizzi host[:porta] separati da virgole; la porta predefinita è quella del primario"""
+    addresses = []
+    for item in value.split(','):
+        item = item.strip()
+        if item:
+            host, _, port = item.partition(':')
+            addresses.append((host, port or DB_CONFIG['PORT']))
+    return addresses
+
+def get_replicas():
+    """Repliche configurate in READ_REPLICAS (None se non ce ne sono)"""
+    global _replicas
+    if _replicas is None:
+        with _pool_lock:
+            if _replicas is None:
+                _replicas = ReplicaSet(parse_replicas(DB_CONFIG.get('READ_REPLICAS', '')))
+    return _replicas if _replicas.replicas else None
+
+def wrote_recently():
+    """True se la sessione ha modificato dati da meno di REPLICA_STICKY_SECONDS (legge le proprie scritture)"""
+    if not has_request_context():
+        return False
+    return session.get('ultima_scrittura', 0) > time.time() - replica_setting('REPLICA_STICKY_SECONDS')
+
+def acquire_read_connection(replicas):
+    """Connessione in sola lettura, nella stessa richiesta sempre dallo stesso server.
+
+    Le versioni delle tabelle lette da cached_page e i dati della pagina
+    devono venire dalla stessa replica: altrimenti righe di una replica in
+    ritardo finirebbero in cache sotto la versione più recente letta da
+    un'altra. Restituisce (None, None) per leggere dal primario.
+    """
+    pinned = g.get('read_pool') if has_request_context() else None
+    if pinned is not None:
+        try:
+            return pinned, pinned.acquire()
+        except Error:
+            # Il primario non è mai indietro rispetto alla replica scelta
+            return None, None
+    pool, raw = replicas.acquire()
+    if has_request_context():
+        g.read_pool = pool if raw is not None else get_pool()
+    return pool, raw
+
+def get_db_connection(read_only=False):
+    """Prende in prestito una connessione dal pool MySQL.
+
+    Con read_only=True la connessione arriva da una replica, se configurata
+    e sana, tranne quando la sessione ha appena scritto: allora legge dal
+    primario per vedere subito le proprie modifiche. Tutte le letture di
+    una richiesta usano la stessa replica (vedi acquire_read_connection).
+    """
     try:
-        connection = mysql.connector.connect(
-            host=DB_CONFIG['HOST'],
-            port=int(DB_CONFIG['PORT']),
-            database=DB_CONFIG['DATABASE'],
-            user=DB_CONFIG['USERNAME'],
-            password=DB_CONFIG['PASSWORD']
-        )
+        start = time.perf_counter()
+        pool, raw = None, None
+        replicas = get_replicas() if read_only and not wrote_recently() else None
+        if replicas is not None:
+            pool, raw = acquire_read_connection(replicas)
+        if raw is None:
+            pool = get_pool()
+            raw = pool.acquire()
+        connection = PooledConnection(pool, raw)
+        DB_CONNECT_SECONDS.observe(time.perf_counter() - start)
+        if has_request_context():
+            # Garantisce la restituzione anche se la route non chiama close()
+            g.setdefault('db_connections', []).append(connection)
         return connection
     except Error as e:
         print(f"Errore durante la connessione al database: {e}")
         return None
 
+@app.teardown_request
+def release_db_connections(exc):
+    """Restituisce al pool le connessioni ancora in prestito a fine richiesta"""
+    for connection in g.pop('db_connections', []):
+        connection.close()
+
+# METRICHE
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def escape_label(value):
+    """Escape di un valore di etichetta Prometheus"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+def format_labels(labels):
+    """Etichette nel formato testuale di Prometheus"""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+class Metric:
+    """Metrica in memoria con un valore per ogni combinazione di etichette"""
+
+    kind = None
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(zip(self.label_names, (labels[name] for name in self.label_names)))
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+class Counter(Metric):
+    """Contatore monotono"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_value(self, key, value):
+        return [f'{self.name}{format_labels(key)} {value}']
+
+class Histogram(Metric):
+    """Istogramma di durate con bucket cumulativi, somma e conteggio"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * len(self.buckets) + [0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def _render_value(self, key, counts):
+        lines = [f'{self.name}_bucket{format_labels(key + (("le", bound),))} {counts[index]}'
+                 for index, bound in enumerate(self.buckets)]
+        lines.append(f'{self.name}_bucket{format_labels(key + (("le", "+Inf"),))} {counts[-2]}')
+        lines.append(f'{self.name}_sum{format_labels(key)} {counts[-1]}')
+        lines.append(f'{self.name}_count{format_labels(key)} {counts[-2]}')
+        return lines
+
+REQUEST_SECONDS = Histogram('immobiliare_request_duration_seconds',
+                            'Durata delle richieste HTTP per route', ('route', 'method', 'status'))
+DB_CONNECT_SECONDS = Histogram('immobiliare_db_connect_duration_seconds',
+                               'Attesa per ottenere una connessione dal pool')
+SQL_SECONDS = Histogram('immobiliare_sql_duration_seconds',
+                        'Durata delle istruzioni SQL', ('route', 'statement'))
+SQL_ROWS = Counter('immobiliare_sql_rows_total',
+                   'Righe lette o modificate dalle istruzioni SQL', ('route', 'statement'))
+SQL_SLOW = Counter('immobiliare_sql_slow_total',
+                   'Istruzioni SQL oltre la soglia SLOW_QUERY_MS', ('route', 'statement'))
+TEMPLATE_SECONDS = Histogram('immobiliare_template_render_duration_seconds',
+                             'Durata del rendering dei template', ('template',))
+PAGE_CACHE_RESULTS = Counter('immobiliare_page_cache_total',
+                             'Risposte delle pagine in cache per esito (304, hit, miss, non_memorizzabile)',
+                             ('esito',))
+METRICS = [REQUEST_SECONDS, DB_CONNECT_SECONDS, SQL_SECONDS, SQL_ROWS, SQL_SLOW, TEMPLATE_SECONDS,
+           PAGE_CACHE_RESULTS]
+
+def current_route():
+    """Route della richiesta in corso, usata come etichetta delle metriche"""
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return 'nessuna'
+
+@functools.lru_cache(maxsize=1024)
+def statement_label(sql):
+    """Forma compatta di un'istruzione SQL (i parametri sono già segnaposto %s).
+
+    L'inizio del testo rende l'etichetta leggibile, l'hash distingue
+    istruzioni che iniziano allo stesso modo.
+    """
+    normalized = ' '.join(sql.split())
+    digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:8]
+    return f"{normalized[:120]} #{digest}"
+
+class InstrumentedCursor:
+    """Cursore che misura la durata delle istruzioni e conta le righe restituite"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._labels = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def _timed(self, method, sql, params):
+        self._labels = {'route': current_route(), 'statement': statement_label(sql)}
+        start = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            elapsed = time.perf_counter() - start
+            SQL_SECONDS.observe(elapsed, **self._labels)
+            if elapsed * 1000 >= float(DB_CONFIG.get('SLOW_QUERY_MS', 500)):
+                SQL_SLOW.inc(**self._labels)
+                app.logger.warning("Query lenta (%.1f ms) su %s: %s %r",
+                                   elapsed * 1000, self._labels['route'], self._labels['statement'], params)
+            if self._cursor.rowcount > 0 and not sql.lstrip().upper().startswith('SELECT'):
+                SQL_ROWS.inc(self._cursor.rowcount, **self._labels)
+
+    def execute(self, sql, params=()):
+        return self._timed(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, params):
+        return self._timed(self._cursor.executemany, sql, params)
+
+    def _count(self, rows):
+        if self._labels is not None and rows:
+            SQL_ROWS.inc(len(rows), **self._labels)
+        return rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._count([row])
+        return row
+
+    def fetchmany(self, size=1):
+        return self._count(self._cursor.fetchmany(size))
+
+    def fetchall(self):
+        return self._count(self._cursor.fetchall())
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_duration(response):
+    if 'request_start' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, route=current_route(),
+                                method=request.method, status=response.status_code)
+    return response
+
+@before_render_template.connect_via(app)
+def start_template_timer(sender, template, context, **extra):
+    g.setdefault('template_starts', []).append(time.perf_counter())
+
+@template_rendered.connect_via(app)
+def record_template_duration(sender, template, context, **extra):
+    starts = g.get('template_starts')
+    if starts:
+        TEMPLATE_SECONDS.observe(time.perf_counter() - starts.pop(), template=template.name)
+
+# MIGRAZIONI DELLO SCHEMA
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+def list_migrations():
+    """Elenco ordinato delle migrazioni disponibili come coppie (versione, percorso)"""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if filename.endswith('.sql'):
+            migrations.append((filename[:-4], os.path.join(MIGRATIONS_DIR, filename)))
+    return migrations
+
+def applied_migrations(cursor):
+    """Versioni già applicate, registrate nella tabella dbSistImm_Migrazioni"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dbSistImm_Migrazioni (
+            versione VARCHAR(100) PRIMARY KEY,
+            applicata_il TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('SELECT versione FROM dbSistImm_Migrazioni')
+    return {row[0] for row in cursor.fetchall()}
+
+def split_sql(script):
+    """Divide uno script SQL nelle singole istruzioni, ignorando i commenti"""
+    lines = [line for line in script.splitlines() if not line.strip().startswith('--')]
+    return [statement.strip() for statement in '\n'.join(lines).split(';') if statement.strip()]
+
+def apply_migrations():
+    """Applica in ordine le migrazioni non ancora eseguite"""
+    conn = get_db_connection()
+    if conn is None:
+        print("Impossibile connettersi al database!")
+        return False
+    
+    try:
+        cursor = conn.cursor()
+        done = applied_migrations(cursor)
+        for version, path in list_migrations():
+            if version in done:
+                continue
+            print(f"Applico la migrazione {version}...")
+            with open(path, 'r', encoding='utf-8') as file:
+                for statement in split_sql(file.read()):
+                    cursor.execute(statement)
+            cursor.execute('INSERT INTO dbSistImm_Migrazioni (versione) VALUES (%s)', (version,))
+            conn.commit()
+        print("Schema aggiornato!")
+        return True
+        
+    except Error as e:
+        print(f"Errore durante la migrazione: {e}")
+        return False
+    finally:
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+
 def init_database():
     """Verifica la connessione al database esistente"""
     conn = get_db_connection()
@@ -60,7 +778,24 @@ def init_database():
         
         if not clienti_table or not immobili_table:
             print("Errore: Le tabelle richieste non sono presenti nel database!")
+            print("Per una nuova installazione esegui 'python flask_app.py migrate' per creare lo schema")
             return False
+        
+        pending = [version for version, _ in list_migrations() if version not in applied_migrations(cursor)]
+        conn.commit()
+        if pending:
+            print(f"Attenzione: migrazioni non applicate: {pending}")
+            print("Esegui 'python flask_app.py migrate' per aggiornare lo schema")
+        
+        # Controllo rapido degli indici; l'analisi con EXPLAIN è in 'python flask_app.py schema'.
+        # È solo un avviso: un errore qui non impedisce l'avvio
+        try:
+            for table, columns, uso in missing_indexes(cursor):
+                print(f"Attenzione: manca un indice su {table} ({', '.join(columns)}), usato per {uso}")
+            if DB_CONFIG.get('SCHEMA_ADVISOR', '0') == '1':
+                report_query_plans(cursor)
+        except Error as e:
+            print(f"Attenzione: verifica degli indici non riuscita: {e}")
             
         print("Database verificato con successo!")
         return True
@@ -73,154 +808,1463 @@ def init_database():
             cursor.close()
             conn.close()
 
-# Route principale - Dashboard
-@app.route('/')
-def index():
-    """Pagina principale con statistiche generali"""
-    conn = get_db_connection()
+# PAGINAZIONE
+
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 200
+
+def get_pagination_args():
+    """Legge i parametri page e limit dalla query string, entro i limiti consentiti"""
+    page = max(request.args.get('page', 1, type=int) or 1, 1)
+    limit = request.args.get('limit', PAGE_SIZE_DEFAULT, type=int) or PAGE_SIZE_DEFAULT
+    return page, min(max(limit, 1), PAGE_SIZE_MAX)
+
+def encode_cursor(values):
+    """Codifica i valori della chiave di ordinamento in un cursore opaco per l'URL"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(token, size):
+    """Decodifica un cursore prodotto da encode_cursor (None se assente o non valido)"""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+def build_pagination(page, limit, totale, next_after, keyset):
+    """Dati di paginazione passati ai template"""
+    pagine = max((totale + limit - 1) // limit, 1)
+    return {
+        'page': page,
+        'limit': limit,
+        'totale': totale,
+        'pagine': pagine,
+        'keyset': keyset,
+        'next_after': next_after,
+        'has_prev': page > 1 and not keyset,
+        'has_next': next_after is not None,
+    }
+
+# RICERCA FULL-TEXT
+
+# Lunghezza minima dei termini indicizzati da InnoDB (innodb_ft_min_token_size)
+FT_MIN_TOKEN = 3
+
+def fulltext_terms(search_query):
+    """Converte il testo cercato in una query BOOLEAN MODE: tutti i termini, per prefisso.
+
+    I termini più corti di FT_MIN_TOKEN non sono nell'indice e vengono
+    ignorati; se non ne resta nessuno restituisce None (ricerca con LIKE).
+    """
+    terms = [term for term in re.split(r'\W+', search_query.lower()) if len(term) >= FT_MIN_TOKEN]
+    if not terms:
+        return None
+    return ' '.join(f'+{term}*' for term in terms)
+
+# CACHE
+
+class TTLCache:
+    """Cache in memoria con scadenza, condivisa tra i thread del processo.
+
+    La durata è letta da connessione.txt (chiave `ttl_key`) al momento del
+    salvataggio. invalidate() incrementa una generazione: un caricamento
+    iniziato prima dell'invalidazione non sovrascrive la cache con dati vecchi.
+    Con `max_entries` oltre il limite vengono scartate le voci scadute e poi
+    le più vecchie.
+    """
+
+    def __init__(self, ttl_key, ttl_default, max_entries=None):
+        self.ttl_key = ttl_key
+        self.ttl_default = ttl_default
+        self.max_entries = max_entries
+        self._data = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """Valore in cache per `key`, oppure il risultato di loader() (None non viene salvato)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            generation = self._generation
+        value = loader()
+        if value is not None:
+            ttl = int(DB_CONFIG.get(self.ttl_key, self.ttl_default))
+            with self._lock:
+                if generation == self._generation:
+                    self._data.pop(key, None)
+                    self._data[key] = (time.monotonic() + ttl, value)
+                    if self.max_entries is not None and len(self._data) > self.max_entries:
+                        self._evict()
+        return value
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in self._data.items() if expires <= now]:
+            del self._data[key]
+        while len(self._data) > self.max_entries:
+            del self._data[next(iter(self._data))]
+
+    @property
+    def generation(self):
+        """Versione corrente dei dati, incrementata a ogni invalidazione"""
+        with self._lock:
+            return self._generation
+
+    def invalidate(self):
+        """Svuota la cache"""
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+# Le chiavi includono le versioni delle tabelle (vedi shared_cache_key): le
+# voci di versioni superate restano solo fino all'espulsione
+stats_cache = TTLCache('STATS_CACHE_TTL', 60, max_entries=8)
+clienti_cache = TTLCache('CLIENTI_CACHE_TTL', 300, max_entries=2)
+page_cache = TTLCache('PAGE_CACHE_TTL', 300, max_entries=500)
+
+def on_data_changed(table):
+    """Da chiamare dopo ogni commit che modifica `table`: invalida le cache dipendenti.
+
+    Vale solo per questo processo; gli altri vedono la modifica dalle
+    versioni delle tabelle (touch_tables e shared_cache_key).
+    """
+    stats_cache.invalidate()
+    page_cache.invalidate()
+    if has_request_context():
+        # Per qualche secondo questa sessione legge dal primario (vedi wrote_recently)
+        session['ultima_scrittura'] = time.time()
+    if table == 'dbSistImm_Clienti':
+        clienti_cache.invalidate()
+
+class ClientNameIndex:
+    """Nomi di tutti i clienti in memoria, con ricerca per prefisso su cognome, nome e ID"""
+
+    def __init__(self, rows):
+        # rows: tuple (id_cliente, cognome, nome) ordinate per cognome, nome
+        self.clienti = [{'id_cliente': id_cliente,
+                         'etichetta': f"{cognome} {nome} ({id_cliente})"}
+                        for id_cliente, cognome, nome in rows]
+        keys = []
+        for position, (id_cliente, cognome, nome) in enumerate(rows):
+            for key in (f"{cognome} {nome}", f"{nome} {cognome}", str(id_cliente)):
+                keys.append((key.lower(), position))
+        keys.sort()
+        self._keys = [key for key, _ in keys]
+        self._positions = [position for _, position in keys]
+
+    def search(self, query, limit):
+        """Clienti il cui cognome, nome o ID inizia con `query`, in ordine alfabetico"""
+        query = query.strip().lower()
+        if not query:
+            return self.clienti[:limit]
+        found = set()
+        start = bisect.bisect_left(self._keys, query)
+        for index in range(start, len(self._keys)):
+            if not self._keys[index].startswith(query) or len(found) >= limit:
+                break
+            found.add(self._positions[index])
+        return [self.clienti[position] for position in sorted(found)]
+
+def load_client_index():
+    """Carica i nomi dei clienti per ClientNameIndex"""
+    conn = get_db_connection(read_only=True)
     if conn is None:
-        flash('Errore di connessione al database!', 'error')
-        return render_template('index.html', immobili_totali=0, immobili_disponibili=0, clienti_totali=0)
+        return None
     
     try:
         cursor = conn.cursor()
+        cursor.execute('SELECT id_cliente, cognome, nome FROM dbSistImm_Clienti ORDER BY cognome, nome')
+        return ClientNameIndex(cursor.fetchall())
+    finally:
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+
+# GENERAZIONE DEI CODICI
+
+class CodeAllocator:
+    """Assegna codici progressivi (es. SI0001) senza collisioni tra thread e processi.
+
+    Il contatore vive nella tabella dbSistImm_Sequenze (migrazione 002) ed è
+    incrementato atomicamente con UPDATE ... LAST_INSERT_ID(), che funziona
+    come una sequenza: ogni processo riserva un blocco di SEQUENCE_BLOCK_SIZE
+    numeri e li distribuisce ai propri thread senza altri accessi al database.
+    I numeri di un blocco non usati prima del riavvio restano inutilizzati.
+    """
+
+    def __init__(self, sequence, prefix):
+        self.sequence = sequence
+        self.prefix = prefix
+        self.reset()
+
+    def reset(self):
+        """Dimentica il blocco riservato (usato nei processi figli dopo una fork)"""
+        self._next = 1
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, count):
+        """Riserva sul database `count` numeri consecutivi e restituisce il range"""
+        conn = get_db_connection()
+        if conn is None:
+            raise Error('Errore di connessione al database!')
         
-        # Statistiche per la dashboard
-        cursor.execute('SELECT COUNT(*) FROM dbSistImm_Immobili')
-        immobili_totali = cursor.fetchone()[0]
+        try:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE dbSistImm_Sequenze SET valore = LAST_INSERT_ID(valore + %s) WHERE nome = %s',
+                           (count, self.sequence))
+            if cursor.rowcount != 1:
+                raise Error(f"Sequenza '{self.sequence}' non inizializzata: esegui 'python flask_app.py migrate'")
+            cursor.execute('SELECT LAST_INSERT_ID()')
+            last = cursor.fetchone()[0]
+            conn.commit()
+            return range(last - count + 1, last + 1)
+        finally:
+            if conn.is_connected():
+                cursor.close()
+                conn.close()
+
+    def format(self, number):
+        """Codice nel formato prefisso + numero a 4 cifre"""
+        return f"{self.prefix}{number:04d}"
+
+    def advance(self, cursor, codes):
+        """Porta il contatore oltre i codici inseriti esplicitamente (es. da importazione)"""
+        numbers = [int(match.group(1)) for match in
+                   (re.fullmatch(rf'{self.prefix}(\d+)', code) for code in codes) if match]
+        if numbers:
+            cursor.execute('UPDATE dbSistImm_Sequenze SET valore = GREATEST(valore, %s) WHERE nome = %s',
+                           (max(numbers), self.sequence))
+
+    def next_code(self):
+        """Prossimo codice libero, preso dal blocco riservato dal processo"""
+        with self._lock:
+            if self._next > self._last:
+                block = self.reserve(int(DB_CONFIG.get('SEQUENCE_BLOCK_SIZE', 10)))
+                self._next, self._last = block.start, block.stop - 1
+            number = self._next
+            self._next += 1
+        return self.format(number)
+
+codici_immobili = CodeAllocator('immobili', 'SI')
+codici_clienti = CodeAllocator('clienti', 'SIC')
+
+def reset_after_fork():
+    """Nei worker creati con fork (gunicorn --preload) non riusa pool e blocchi di codici del padre.
+
+    Le connessioni aperte dal processo padre non possono essere condivise e
+    un blocco di codici già riservato verrebbe assegnato due volte.
+    """
+    global _pool, _replicas, _pool_lock, _jobs
+    _pool = None
+    _replicas = None
+    _pool_lock = threading.Lock()
+    _jobs = None  # i thread del worker non sopravvivono al fork
+    codici_immobili.reset()
+    codici_clienti.reset()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_after_fork)
+
+# CACHE HTTP E COMPRESSIONE
+
+COMPRESS_MIN_SIZE = 500
+COMPRESSIBLE_TYPES = {'text/html', 'text/plain', 'text/css', 'text/csv', 'application/json',
+                      'application/javascript', 'application/x-ndjson'}
+
+def render_fingerprint():
+    """Impronta del codice e dei template, con la data dell'ultima modifica.
+
+    Entra negli ETag, così dopo un aggiornamento dell'applicazione le pagine
+    già in cache nei browser non vengono più considerate valide.
+    """
+    base = os.path.dirname(os.path.abspath(__file__))
+    templates = os.path.join(base, 'templates')
+    paths = [os.path.abspath(__file__)] + sorted(os.path.join(templates, name) for name in os.listdir(templates))
+    # Le pagine riportano i nomi delle risorse costruite (vedi RISORSE STATICHE)
+    manifest = os.path.join(base, 'static', 'dist', 'manifest.json')
+    if os.path.exists(manifest):
+        paths.append(manifest)
+    digest = hashlib.sha1()
+    latest = 0
+    for path in paths:
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+        latest = max(latest, os.path.getmtime(path))
+    return digest.hexdigest()[:12], datetime.fromtimestamp(int(latest), timezone.utc)
+
+RENDER_VERSION, RENDER_MODIFIED = render_fingerprint()
+
+def version_bump_query(*tables):
+    """SQL e parametri che incrementano la versione delle tabelle (migrazione 003)"""
+    return (f"""UPDATE dbSistImm_Versioni SET versione = versione + 1, modificato = CURRENT_TIMESTAMP(6)
+        WHERE tabella IN ({', '.join(['%s'] * len(tables))})""", list(tables))
+
+def touch_tables(cursor, *tables):
+    """Segna le tabelle come modificate; va eseguita nella transazione della modifica, prima del commit"""
+    cursor.execute(*version_bump_query(*tables))
+
+def load_table_versions(tables):
+    """Versioni delle tabelle e data dell'ultima modifica, o None se non disponibili"""
+    conn = get_db_connection(read_only=True)
+    if conn is None:
+        return None
+    
+    try:
+        # Eseguita a ogni richiesta di pagina: istruzione preparata
+        rows = conn.query(f"""SELECT tabella, versione, UNIX_TIMESTAMP(modificato) AS modificato
+            FROM dbSistImm_Versioni WHERE tabella IN ({', '.join(['%s'] * len(tables))})""", tables)
+        if len(rows) != len(tables):
+            return None
+        versions = sorted((row.tabella, row.versione) for row in rows)
+        modified = datetime.fromtimestamp(int(max(row.modificato for row in rows)), timezone.utc)
+        return versions, max(modified, RENDER_MODIFIED)
         
-        cursor.execute('SELECT COUNT(*) FROM dbSistImm_Immobili WHERE stato = "Disponibile"')
-        immobili_disponibili = cursor.fetchone()[0]
+    except Error as e:
+        # Migrazione 003 non applicata: le pagine vengono servite senza cache
+        app.logger.warning(f"Versioni delle tabelle non disponibili: {e}")
+        return None
+    finally:
+        if conn.is_connected():
+            conn.close()
+
+def shared_cache_key(name, *tables):
+    """Chiave per stats_cache e clienti_cache legata alle versioni condivise di `tables`.
+
+    Le cache sono del singolo processo, mentre le scritture possono arrivare
+    da altri worker, dall'API o dai lavori in background: con le versioni
+    nella chiave una modifica fatta altrove rende subito inutilizzabile la
+    voce vecchia. Dentro cached_page riusa le versioni già lette per l'ETag,
+    così pagina e dati memorizzati corrispondono alla stessa versione.
+    """
+    versions = dict(g.get('table_versions') or ()) if has_request_context() else {}
+    if not all(table in versions for table in tables):
+        state = load_table_versions(tables)
+        if state is None:
+            return (name,)  # versioni non disponibili: resta solo la scadenza
+        versions = dict(state[0])
+    return (name,) + tuple((table, versions[table]) for table in sorted(tables))
+
+def negotiate_encoding():
+    """Codifica di compressione preferita dal client tra quelle disponibili (o None)"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def compress(data, encoding):
+    """Comprime `data` con la codifica scelta da negotiate_encoding()"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+def set_cache_headers(response, etag, modified):
+    """Intestazioni di validazione: il browser conserva la pagina ma la riconvalida sempre"""
+    response.set_etag(etag)
+    response.last_modified = modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+def cached_page(*tables):
+    """Decoratore per le pagine che dipendono solo da `tables` e dai parametri della richiesta.
+
+    L'ETag è calcolato dalle versioni delle tabelle, dall'URL e dalla
+    compressione, prima di eseguire la route: se il browser ha già la pagina
+    riceve 304 senza query, altrimenti il corpo già compresso viene preso da
+    page_cache e la route viene eseguita solo la prima volta. Le risposte con
+    messaggi flash o con codice diverso da 200 non vengono mai memorizzate.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            # In debug i template modificati devono comparire subito
+            if app.debug or session.get('_flashes'):
+                return view(*args, **kwargs)
+            state = load_table_versions(tables)
+            if state is None:
+                return view(*args, **kwargs)
+            versions, modified = state
+            g.table_versions = versions
+            encoding = negotiate_encoding()
+            key = json.dumps([RENDER_VERSION, request.path, sorted(request.args.items(multi=True)), versions])
+            etag = hashlib.sha1(key.encode()).hexdigest()[:20] + (f'-{encoding}' if encoding else '')
+            
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = request.if_modified_since is not None and modified <= request.if_modified_since
+            if not_modified:
+                PAGE_CACHE_RESULTS.inc(esito='304')
+                return set_cache_headers(Response(status=304), etag, modified)
+            
+            rendered = {}
+            def render():
+                response = rendered['response'] = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or get_flashed_messages():
+                    return None
+                body = response.get_data()
+                return (compress(body, encoding) if encoding else body), response.mimetype
+            entry = page_cache.get(etag, render)
+            if entry is None:
+                PAGE_CACHE_RESULTS.inc(esito='non_memorizzabile')
+                return rendered['response']
+            PAGE_CACHE_RESULTS.inc(esito='miss' if rendered else 'hit')
+            body, mimetype = entry
+            response = Response(body, mimetype=mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+            return set_cache_headers(response, etag, modified)
+        return wrapper
+    return decorator
+
+@app.after_request
+def compress_response(response):
+    """Comprime le altre risposte testuali se il client lo consente"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    encoding = negotiate_encoding()
+    response.vary.add('Accept-Encoding')
+    if encoding is None or response.content_length is None or response.content_length < COMPRESS_MIN_SIZE:
+        return response
+    response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+# RISORSE STATICHE
+
+# Bootstrap e bootstrap-icons sono vendorizzati in static/vendor (la rete
+# dell'ufficio non raggiunge internet): 'python flask_app.py assets scarica'
+# li scarica una volta da cdnjs, 'python flask_app.py assets' costruisce in
+# static/dist i pacchetti minificati con l'impronta nel nome, le varianti
+# .gz/.br e il CSS critico da includere nelle pagine. Finché mancano sia la
+# build sia i file vendorizzati le pagine usano cdnjs e create_app() lo
+# segnala all'avvio.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+ASSETS_BUILD_DIR = os.path.join(STATIC_DIR, 'dist')
+ASSETS_MAX_AGE = 365 * 24 * 3600  # il nome cambia con il contenuto: il file può restare in cache per sempre
+
+VENDOR_ASSETS = {
+    'bootstrap.min.css': 'https://cdnjs.cloudflare.com/ajax/libs/bootstrap/5.3.2/css/bootstrap.min.css',
+    'bootstrap.bundle.min.js': 'https://cdnjs.cloudflare.com/ajax/libs/bootstrap/5.3.2/js/bootstrap.bundle.min.js',
+    'bootstrap-icons.min.css': 'https://cdnjs.cloudflare.com/ajax/libs/bootstrap-icons/1.11.3/font/bootstrap-icons.min.css',
+    'fonts/bootstrap-icons.woff2': 'https://cdnjs.cloudflare.com/ajax/libs/bootstrap-icons/1.11.3/font/fonts/bootstrap-icons.woff2',
+    'fonts/bootstrap-icons.woff': 'https://cdnjs.cloudflare.com/ajax/libs/bootstrap-icons/1.11.3/font/fonts/bootstrap-icons.woff',
+}
+
+# Pacchetti: file sorgente (relativi a static/) concatenati nell'ordine indicato
+ASSET_BUNDLES = {
+    'app.css': ['vendor/bootstrap.min.css', 'vendor/bootstrap-icons.min.css', 'custom_css.css'],
+    'app.js': ['vendor/bootstrap.bundle.min.js'],
+}
+
+# Classi del CSS critico oltre a quelle di layout.html: messaggi flash e
+# intestazione comune delle pagine, visibili prima del foglio completo
+CRITICAL_EXTRA_CLASSES = {'alert-success', 'alert-danger', 'd-flex', 'justify-content-between',
+                          'align-items-center', 'mb-4', 'row', 'btn', 'btn-primary', 'btn-success'}
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+def download_vendor_assets():
+    """Scarica i file di VENDOR_ASSETS in static/vendor (da eseguire su una macchina con accesso a internet)"""
+    for name, url in VENDOR_ASSETS.items():
+        path = os.path.join(STATIC_DIR, 'vendor', name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response, open(path, 'wb') as file:
+            file.write(response.read())
+        print(f"Scaricato {name}")
+    return True
+
+def minify_css(css):
+    """Minificazione prudente: commenti (tranne le licenze /*! */) e spazi superflui"""
+    css = re.sub(r'/\*(?!!).*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    # Solo nelle dichiarazioni: nei selettori '.a :hover' è diverso da '.a:hover'
+    css = re.sub(r'\{[^{}]*\}', lambda block: re.sub(r':\s+', ':', block.group(0)), css)
+    return css.replace(';}', '}').strip()
+
+def write_fingerprinted(name, data):
+    """Scrive `data` in static/dist con l'impronta nel nome e le varianti precompresse; restituisce il nome"""
+    stem, ext = os.path.splitext(name)
+    filename = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+    path = os.path.join(ASSETS_BUILD_DIR, filename)
+    with open(path, 'wb') as file:
+        file.write(data)
+    if ext in ('.css', '.js', '.svg'):
+        with open(path + '.gz', 'wb') as file:
+            file.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as file:
+                file.write(brotli.compress(data, quality=11))
+    return filename
+
+def rewrite_css_urls(css, source_dir, copied):
+    """Copia in static/dist i file referenziati da url(...) (es. i font) e ne riscrive il percorso"""
+    def replace(match):
+        url = match.group(2)
+        if url.startswith(('data:', 'http:', 'https:', '/', '#')):
+            return match.group(0)
+        path = os.path.normpath(os.path.join(source_dir, re.split(r'[?#]', url)[0]))
+        if path not in copied:
+            with open(path, 'rb') as file:
+                copied[path] = write_fingerprinted(os.path.basename(path), file.read())
+        return f'url("{copied[path]}")'
+    return CSS_URL.sub(replace, css)
+
+def css_blocks(css):
+    """Blocchi di primo livello del CSS come coppie (intestazione, contenuto)"""
+    blocks = []
+    depth, start, body_start, quote, index = 0, 0, 0, None, 0
+    while index < len(css):
+        char = css[index]
+        if quote:
+            if char == '\\':
+                index += 1
+            elif char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '{':
+            if depth == 0:
+                body_start = index + 1
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                # Le istruzioni senza blocco (es. @charset) precedono l'intestazione
+                prelude = css[start:body_start - 1].rsplit(';', 1)[-1].strip()
+                blocks.append((prelude, css[body_start:index]))
+                start = index + 1
+        index += 1
+    return blocks
+
+def split_selectors(prelude):
+    """Selettori separati da virgole, escluse quelle tra parentesi (es. :not(a, b))"""
+    selectors, depth, start = [], 0, 0
+    for index, char in enumerate(prelude):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            selectors.append(prelude[start:index].strip())
+            start = index + 1
+    selectors.append(prelude[start:].strip())
+    return selectors
+
+def extract_critical_css(css, classes):
+    """Regole che usano solo le classi indicate (o nessuna classe), @media e @supports compresi"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    rules = []
+    for prelude, body in css_blocks(css):
+        if prelude.startswith(('@media', '@supports')):
+            inner = extract_critical_css(body, classes)
+            if inner:
+                rules.append(f'{prelude}{{{inner}}}')
+        elif prelude.startswith('@'):
+            continue  # @font-face, @keyframes...: arrivano con il foglio completo
+        else:
+            selectors = [selector for selector in split_selectors(prelude)
+                         if set(re.findall(r'\.(-?[_a-zA-Z][\w-]*)', selector)) <= classes]
+            if selectors:
+                rules.append(f"{','.join(selectors)}{{{body}}}")
+    return ''.join(rules)
+
+def layout_classes():
+    """Classi usate in layout.html, presente in tutte le pagine"""
+    with open(os.path.join(os.path.dirname(STATIC_DIR), 'templates', 'layout.html'), encoding='utf-8') as file:
+        values = re.findall(r'class="([^"]*)"', file.read())
+    return {name for value in values for name in value.split() if '{' not in name and '}' not in name}
+
+def missing_vendor_assets():
+    """File di VENDOR_ASSETS assenti da static/vendor"""
+    return [name for name in VENDOR_ASSETS if not os.path.exists(os.path.join(STATIC_DIR, 'vendor', name))]
+
+def build_assets():
+    """Costruisce pacchetti, varianti compresse, CSS critico e manifest in static/dist (comando 'assets')"""
+    missing = missing_vendor_assets()
+    if missing:
+        print(f"File vendorizzati mancanti in static/vendor: {', '.join(missing)}")
+        print("Esegui 'python flask_app.py assets scarica' su una macchina con accesso a internet, "
+              "oppure copia i file da un'altra installazione")
+        return False
+    
+    os.makedirs(ASSETS_BUILD_DIR, exist_ok=True)
+    manifest, copied = {}, {}
+    for bundle, sources in ASSET_BUNDLES.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(STATIC_DIR, source), encoding='utf-8') as file:
+                text = file.read()
+            if source.endswith('.css'):
+                text = rewrite_css_urls(text, os.path.dirname(os.path.join(STATIC_DIR, source)), copied)
+                # I file .min sono già minificati a monte: solo i nostri passano da minify_css
+                text = text if '.min.' in source else minify_css(text)
+            # Le mappe dei sorgenti non vengono pubblicate
+            text = re.sub(r'^\s*(//# sourceMappingURL=.*|/\*# sourceMappingURL=.*?\*/)\s*$', '', text, flags=re.M)
+            parts.append(text.strip())
+        content = ('\n' if bundle.endswith('.css') else ';\n').join(parts)
+        manifest[bundle] = write_fingerprinted(bundle, content.encode('utf-8'))
+        if bundle == 'app.css':
+            critical = extract_critical_css(content, layout_classes() | CRITICAL_EXTRA_CLASSES)
+            with open(os.path.join(ASSETS_BUILD_DIR, 'critical.css'), 'w', encoding='utf-8') as file:
+                file.write(critical)
+            manifest['critical.css'] = 'critical.css'
+        print(f"{bundle} -> {manifest[bundle]} ({len(content.encode('utf-8')) // 1024} KiB)")
+    
+    with open(os.path.join(ASSETS_BUILD_DIR, 'manifest.json'), 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+    print("Risorse costruite: riavvia l'applicazione per usarle")
+    return True
+
+@functools.lru_cache(maxsize=None)
+def asset_manifest():
+    """Manifest di static/dist, letto una volta per processo ({} se le risorse non sono state costruite)"""
+    try:
+        with open(os.path.join(ASSETS_BUILD_DIR, 'manifest.json'), encoding='utf-8') as file:
+            manifest = json.load(file)
+        with open(os.path.join(ASSETS_BUILD_DIR, manifest['critical.css']), encoding='utf-8') as file:
+            manifest['critical'] = Markup(file.read())
+        return manifest
+    except (OSError, ValueError, KeyError):
+        return {}
+
+@app.template_global()
+def asset_urls(bundle):
+    """Indirizzi da includere per un pacchetto: quello costruito, altrimenti i singoli sorgenti.
+
+    Senza build (es. in sviluppo) un file vendorizzato mancante viene
+    caricato da cdnjs.
+    """
+    manifest = asset_manifest()
+    if bundle in manifest:
+        return [url_for('asset', filename=manifest[bundle])]
+    urls = []
+    for source in ASSET_BUNDLES[bundle]:
+        vendor = source.removeprefix('vendor/')
+        if vendor != source and not os.path.exists(os.path.join(STATIC_DIR, source)):
+            urls.append(VENDOR_ASSETS[vendor])
+        else:
+            urls.append(url_for('static', filename=source))
+    return urls
+
+@app.template_global()
+def critical_css():
+    """CSS critico da includere nella pagina ('' se le risorse non sono state costruite)"""
+    return asset_manifest().get('critical', '')
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """Risorse con impronta nel nome: in cache per un anno, nella variante precompressa se accettata"""
+    served, encoding = filename, None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[candidate] and os.path.isfile(os.path.join(ASSETS_BUILD_DIR, filename + suffix)):
+            served, encoding = filename + suffix, candidate
+            break
+    response = send_from_directory(ASSETS_BUILD_DIR, served, mimetype=mimetypes.guess_type(filename)[0],
+                                   max_age=ASSETS_MAX_AGE)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
+# STORICO DELLE MODIFICHE
+
+# Ogni scrittura registra una riga in dbSistImm_Modifiche (migrazione 006)
+# nella propria transazione: lo storico contiene solo modifiche confermate.
+CHANGE_LOG_SQL = '''INSERT INTO dbSistImm_Modifiche (tabella, chiave, operazione, versione, dati, origine)
+    VALUES (%s, %s, %s, %s, %s, %s)'''
+CHANGES_SETTLE_SECONDS = 5  # attesa prima di esporre una modifica: riduce, non esclude, i salti (vedi modifiche)
+
+def change_log_row(table, key, operation, version, values, origin='web'):
+    """Parametri di CHANGE_LOG_SQL per una modifica; `values` sono i valori scritti"""
+    dati = json.dumps(values, default=json_default, ensure_ascii=False) if values is not None else None
+    return (table, key, operation, version, dati, origin)
+
+def change_log_query(table, key, operation, version, values, origin='web'):
+    """SQL e parametri che registrano una modifica nello storico"""
+    return CHANGE_LOG_SQL, change_log_row(table, key, operation, version, values, origin)
+
+def log_change(cursor, table, key, operation, version, values, origin='web'):
+    """Registra una modifica; va eseguita nella transazione della modifica, prima del commit"""
+    cursor.execute(*change_log_query(table, key, operation, version, values, origin))
+
+def deletion_log_query(spec, key, origin='web'):
+    """SQL e parametri che registrano la riga che sta per essere eliminata, con i suoi ultimi valori.
+
+    `spec` è la definizione della tabella in BULK_TABLES.
+    """
+    values = ', '.join(f"'{column}', {column}" for column in spec['colonne'])
+    return (f"""INSERT INTO dbSistImm_Modifiche (tabella, chiave, operazione, versione, dati, origine)
+        SELECT %s, {spec['chiave']}, 'eliminazione', versione, JSON_OBJECT({values}), %s
+        FROM {spec['tabella']} WHERE {spec['chiave']} = %s""", (spec['tabella'], origin, key))
+
+def client_unlink_query(id_cliente):
+    """SQL e parametri che staccano gli immobili dal cliente che sta per essere eliminato.
+
+    La chiave esterna lo farebbe comunque (ON DELETE SET NULL), ma senza
+    incrementare la versione degli immobili: un form aperto prima
+    dell'eliminazione riassocerebbe il cliente senza segnalare il conflitto.
+    """
+    return ('UPDATE dbSistImm_Immobili SET id_cliente = NULL, versione = versione + 1 WHERE id_cliente = %s',
+            (id_cliente,))
+
+def display_value(value):
+    """Valore confrontabile tra database e form: i numeri senza zeri superflui, None come stringa vuota"""
+    if value is None:
+        return ''
+    if isinstance(value, (int, float, Decimal)):
+        return f'{Decimal(str(value)).normalize():f}'
+    return str(value).strip()
+
+def render_conflict(template, name, fields, saved, submitted):
+    """Form con i valori inviati e il confronto con la versione salvata da altri (409).
+
+    `fields` sono coppie (campo, etichetta). Il form riporta la versione
+    attuale: salvandolo di nuovo l'utente sovrascrive consapevolmente.
+    """
+    submitted = dict(submitted, versione=saved['versione'])
+    campi = [(label, saved[field], submitted[field]) for field, label in fields
+             if display_value(saved[field]) != display_value(submitted[field])]
+    conflitto = {'versione': saved['versione'], 'campi': campi}
+    return render_template(template, **{name: submitted}, conflitto=conflitto), 409
+
+@app.route('/modifiche')
+def modifiche():
+    """Modifiche successive all'id `dopo`, in ordine, in JSON.
+
+    Permette a cache e indici esterni di aggiornarsi in modo incrementale
+    senza rileggere le tabelle: il client riparte dall'`ultimo` restituito.
+
+    Il feed è best-effort. Gli id sono assegnati all'inserimento, non al
+    commit: una transazione confermata più di CHANGES_SETTLE_SECONDS dopo
+    l'inserimento della riga (blocchi di importazione grandi, attese di
+    lock) compare dopo id già restituiti e chi legge con `dopo` la salta
+    per sempre. Chi ha bisogno di completezza deve riallinearsi
+    periodicamente rileggendo le tabelle (o dalle versioni delle righe).
+    """
+    dopo = max(request.args.get('dopo', 0, type=int) or 0, 0)
+    limit = min(max(request.args.get('limit', PAGE_SIZE_MAX, type=int) or PAGE_SIZE_MAX, 1), PAGE_SIZE_MAX)
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify(error='Errore di connessione al database!'), 503
+
+    try:
+        rows = conn.query('''SELECT id, tabella, chiave, operazione, versione, dati, origine, modificato
+            FROM dbSistImm_Modifiche
+            WHERE id > %s AND modificato <= NOW(6) - INTERVAL %s SECOND
+            ORDER BY id LIMIT %s''', (dopo, CHANGES_SETTLE_SECONDS, limit))
+        changes = [dict(row._asdict(), dati=json.loads(row.dati) if row.dati else None,
+                        modificato=row.modificato.isoformat()) for row in rows]
+        return jsonify(modifiche=changes, ultimo=changes[-1]['id'] if changes else dopo)
+
+    except Error as e:
+        return jsonify(error=f'Errore nel recupero delle modifiche: {e}'), 500
+    finally:
+        if conn.is_connected():
+            conn.close()
+
+# Route principale - Dashboard
+
+EMPTY_STATS = {
+    'immobili_totali': 0,
+    'immobili_disponibili': 0,
+    'clienti_totali': 0,
+    'per_tipologia': [],
+    'per_stato': [],
+    'per_citta': [],
+    'per_zona': [],
+}
+
+DASHBOARD_STATS_SQL = '''
+    SELECT 'immobili' AS origine, tipologia, stato, citta, zona, COUNT(*)
+    FROM dbSistImm_Immobili
+    GROUP BY tipologia, stato, citta, zona
+    UNION ALL
+    SELECT 'clienti', NULL, NULL, NULL, NULL, COUNT(*)
+    FROM dbSistImm_Clienti
+'''
+
+def load_dashboard_stats():
+    """Calcola tutte le statistiche della dashboard con una sola query raggruppata"""
+    conn = get_db_connection(read_only=True)
+    if conn is None:
+        return None
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute(DASHBOARD_STATS_SQL)
         
-        cursor.execute('SELECT COUNT(*) FROM dbSistImm_Clienti')
-        clienti_totali = cursor.fetchone()[0]
+        stats = dict(EMPTY_STATS)
+        counters = {'tipologia': {}, 'stato': {}, 'citta': {}, 'zona': {}}
+        for origine, tipologia, stato, citta, zona, totale in cursor.fetchall():
+            if origine == 'clienti':
+                stats['clienti_totali'] = totale
+                continue
+            stats['immobili_totali'] += totale
+            for field, value in (('tipologia', tipologia), ('stato', stato), ('citta', citta), ('zona', zona)):
+                value = value or 'Non specificato'
+                counters[field][value] = counters[field].get(value, 0) + totale
         
-        return render_template('index.html', 
-                             immobili_totali=immobili_totali,
-                             immobili_disponibili=immobili_disponibili,
-                             clienti_totali=clienti_totali)
+        stats['immobili_disponibili'] = counters['stato'].get('Disponibile', 0)
+        for field, values in counters.items():
+            # Valori ordinati per numero di immobili decrescente
+            stats[f'per_{field}'] = sorted(values.items(), key=lambda item: (-item[1], item[0]))
+        return stats
         
-    except Error as e:
-        flash(f'Errore nel recupero delle statistiche: {e}', 'error')
-        return render_template('index.html', immobili_totali=0, immobili_disponibili=0, clienti_totali=0)
     finally:
         if conn.is_connected():
             cursor.close()
             conn.close()
 
+@app.route('/')
+@cached_page('dbSistImm_Immobili', 'dbSistImm_Clienti')
+def index():
+    """Pagina principale con statistiche generali"""
+    try:
+        stats = stats_cache.get(shared_cache_key('dashboard', 'dbSistImm_Immobili', 'dbSistImm_Clienti'),
+                                load_dashboard_stats)
+        if stats is None:
+            flash('Errore di connessione al database!', 'error')
+            stats = EMPTY_STATS
+        return render_template('index.html', **stats)
+        
+    except Error as e:
+        flash(f'Errore nel recupero delle statistiche: {e}', 'error')
+        return render_template('index.html', **EMPTY_STATS)
+
+# POSIZIONI E RICERCA PER DISTANZA
+
+# Le coordinate degli immobili (dbSistImm_Posizioni, migrazione 008) sono
+# ricavate da un gazzetteer locale, senza servizi esterni: un CSV con colonne
+# citta, zona, indirizzo, civico, latitudine, longitudine (GAZZETTEER_FILE in
+# connessione.txt). Ogni riga descrive un civico, una via, una zona o una
+# città; per ogni immobile si usa la voce più precisa che gli corrisponde.
+GAZZETTEER_DEFAULT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazzetteer.csv')
+RAGGIO_DEFAULT_KM = 2
+RAGGIO_MAX_KM = 50          # limita il rettangolo letto dall'indice SPATIAL
+METRI_PER_GRADO = 111320    # un grado di latitudine (e di longitudine all'equatore)
+
+# Abbreviazioni dei toponimi, confrontate senza il punto finale
+ABBREVIAZIONI = {'v': 'via', 'v.le': 'viale', 'p.za': 'piazza', 'p.zza': 'piazza', 'pza': 'piazza',
+                 'p.le': 'piazzale', 'c.so': 'corso', 'l.go': 'largo', 'vic': 'vicolo', 'str': 'strada',
+                 'lungotev': 'lungotevere', 's': 'san', 'ss': 'santi'}
+
+COORDINATE = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*[,;\s]\s*(-?\d+(?:\.\d+)?)\s*$')
+
+# Distanza in metri interi dal centro dell'area: valori esatti per il cursore keyset
+DISTANZA_SQL = 'ROUND(ST_Distance_Sphere(p.posizione, ST_GeomFromText(%s)))'
+
+POSITION_UPSERT_SQL = '''INSERT INTO dbSistImm_Posizioni (codice, latitudine, longitudine, posizione, precisione)
+    VALUES (%s, %s, %s, ST_GeomFromText(%s), %s)
+    ON DUPLICATE KEY UPDATE latitudine = VALUES(latitudine), longitudine = VALUES(longitudine),
+        posizione = VALUES(posizione), precisione = VALUES(precisione)'''
+POSITION_DELETE_SQL = 'DELETE FROM dbSistImm_Posizioni WHERE codice = %s'
+
+def normalize_place(text):
+    """Forma confrontabile di un toponimo: minuscole, senza accenti e punteggiatura, abbreviazioni sciolte"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii').lower()
+    words = []
+    for word in re.split(r'[\s,]+', text):
+        word = re.sub(r'[^a-z0-9]', '', ABBREVIAZIONI.get(word.rstrip('.'), word))
+        if word:
+            words.append(word)
+    return ' '.join(words)
+
+def normalize_civic(text):
+    """Forma confrontabile di un numero civico ('10/A', '10 a' -> '10a')"""
+    return normalize_place(text).replace(' ', '')
+
+class Gazetteer:
+    """Coordinate dei luoghi del gazzetteer per civico, via, zona e città.
+
+    Le vie e le città senza una riga propria hanno come posizione il
+    baricentro delle righe che le contengono.
+    """
+
+    def __init__(self, rows):
+        self._places = {'civico': {}, 'via': {}, 'zona': {}, 'citta': {}}
+        contained = {'via': {}, 'citta': {}}
+        for row in rows:
+            citta = normalize_place(row.get('citta'))
+            try:
+                point = (float(row['latitudine']), float(row['longitudine']))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not citta:
+                continue
+            via, civico = normalize_place(row.get('indirizzo')), normalize_civic(row.get('civico'))
+            zona = normalize_place(row.get('zona'))
+            if via and civico:
+                self._places['civico'][(citta, via, civico)] = point
+            elif via:
+                self._places['via'][(citta, via)] = point
+            elif zona:
+                self._places['zona'][(citta, zona)] = point
+            else:
+                self._places['citta'][(citta,)] = point
+            if via:
+                contained['via'].setdefault((citta, via), []).append(point)
+            contained['citta'].setdefault((citta,), []).append(point)
+        for level, groups in contained.items():
+            for key, points in groups.items():
+                self._places[level].setdefault(key, (sum(lat for lat, _ in points) / len(points),
+                                                     sum(lon for _, lon in points) / len(points)))
+
+    def locate(self, citta, indirizzo=None, civico=None, zona=None):
+        """(latitudine, longitudine, precisione) della voce più precisa, o None se la città non è nota"""
+        citta, via = normalize_place(citta), normalize_place(indirizzo)
+        candidates = [('civico', (citta, via, normalize_civic(civico))), ('via', (citta, via)),
+                      ('zona', (citta, normalize_place(zona))), ('citta', (citta,))]
+        for level, key in candidates:
+            point = self._places[level].get(key)
+            if point is not None:
+                return point[0], point[1], level
+        return None
+
+    def search(self, text):
+        """Posizione di un luogo scritto come 'via civico, città', 'zona, città' o 'città'"""
+        parts = [part.strip() for part in text.split(',') if part.strip()]
+        if not parts:
+            return None
+        if len(parts) == 1:
+            return self.locate(parts[0])
+        luogo, citta = parts[0], parts[-1]
+        civico = parts[1] if len(parts) > 2 else None
+        if civico is None:
+            match = re.match(r'^(.*\S)\s+(\d+\S*)$', luogo)
+            if match:
+                luogo, civico = match.groups()
+        return self.locate(citta, luogo, civico, zona=luogo)
+
+def gazetteer_path():
+    return DB_CONFIG.get('GAZZETTEER_FILE') or GAZZETTEER_DEFAULT
+
+def load_gazetteer(path):
+    """Legge il gazzetteer; None se il file non esiste"""
+    try:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as file:
+            return Gazetteer(csv.DictReader(file))
+    except FileNotFoundError:
+        app.logger.warning(f"Gazzetteer non trovato: {path}")
+        return None
+
+gazetteer_cache = TTLCache('GAZZETTEER_CACHE_TTL', 3600, max_entries=2)
+
+def get_gazetteer():
+    """Gazzetteer in cache, riletto da ogni processo quando il file cambia (la data di modifica è nella chiave)"""
+    path = gazetteer_path()
+    try:
+        modified = os.path.getmtime(path)
+    except OSError:
+        modified = None
+    return gazetteer_cache.get((path, modified), lambda: load_gazetteer(path))
+
+def point_wkt(lat, lon):
+    """Punto in WKT, con la longitudine come x"""
+    return f'POINT({lon:.6f} {lat:.6f})'
+
+def bbox_wkt(bbox):
+    """Rettangolo (lat min, lon min, lat max, lon max) come poligono WKT"""
+    lat1, lon1, lat2, lon2 = bbox
+    corners = [(lon1, lat1), (lon2, lat1), (lon2, lat2), (lon1, lat2), (lon1, lat1)]
+    return 'POLYGON((' + ', '.join(f'{lon:.6f} {lat:.6f}' for lon, lat in corners) + '))'
+
+def position_rows(records, gazetteer):
+    """Parametri di POSITION_UPSERT_SQL e di POSITION_DELETE_SQL (indirizzo non trovato) per gli immobili"""
+    upserts, deletes = [], []
+    for values in records:
+        found = gazetteer.locate(values.get('citta'), values.get('indirizzo'), values.get('civico'),
+                                 values.get('zona'))
+        if found is None:
+            deletes.append((values['codice'],))
+        else:
+            lat, lon, precisione = found
+            upserts.append((values['codice'], lat, lon, point_wkt(lat, lon), precisione))
+    return upserts, deletes
+
+def position_queries(values):
+    """(sql, parametri) che aggiornano le coordinate di un immobile, da eseguire nella transazione che lo scrive.
+
+    Senza gazzetteer le coordinate già salvate restano invariate.
+    """
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return []
+    upserts, deletes = position_rows([values], gazetteer)
+    return [(POSITION_UPSERT_SQL, row) for row in upserts] + [(POSITION_DELETE_SQL, row) for row in deletes]
+
+def save_positions(cursor, records):
+    """Aggiorna le coordinate di un blocco di immobili con due executemany; restituisce quelli localizzati"""
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return 0
+    upserts, deletes = position_rows(records, gazetteer)
+    if upserts:
+        cursor.executemany(POSITION_UPSERT_SQL, upserts)
+    if deletes:
+        cursor.executemany(POSITION_DELETE_SQL, deletes)
+    return len(upserts)
+
+def area_around(lat, lon, metri):
+    """Area circolare: centro, raggio in metri e rettangolo che la contiene"""
+    dlat = metri / METRI_PER_GRADO
+    dlon = metri / (METRI_PER_GRADO * max(math.cos(math.radians(lat)), 0.01))
+    return {'lat': lat, 'lon': lon, 'raggio': metri, 'bbox': (lat - dlat, lon - dlon, lat + dlat, lon + dlon)}
+
+def parse_area(args):
+    """Area di ricerca dai parametri: (parametri da ripetere negli URL, area o None).
+
+    `vicino` è un luogo del gazzetteer o 'latitudine,longitudine' e `raggio`
+    è in km; in alternativa `bbox` = 'lat min,lon min,lat max,lon max', con
+    i risultati ordinati per distanza dal centro del rettangolo; entrambi
+    sono limitati da RAGGIO_MAX_KM, così l'indice SPATIAL legge sempre
+    un'area circoscritta e mai l'intera tabella.
+    Solleva ValueError se il luogo non è riconosciuto o l'area non è valida.
+    """
+    vicino = args.get('vicino', '').strip()
+    bbox = args.get('bbox', '').strip()
+    if vicino:
+        raggio = args.get('raggio', RAGGIO_DEFAULT_KM, type=float) or RAGGIO_DEFAULT_KM
+        raggio = min(max(raggio, 0.1), RAGGIO_MAX_KM)
+        match = COORDINATE.match(vicino)
+        if match:
+            found = float(match.group(1)), float(match.group(2)), 'coordinate'
+            if not (-90 <= found[0] <= 90 and -180 <= found[1] <= 180):
+                raise ValueError(f'Coordinate non valide: {vicino}')
+        else:
+            gazetteer = get_gazetteer()
+            found = gazetteer.search(vicino) if gazetteer is not None else None
+            if found is None:
+                raise ValueError(f'Luogo non trovato nel gazzetteer: {vicino}')
+        area = area_around(found[0], found[1], raggio * 1000)
+        area['precisione'] = found[2]
+        return {'vicino': vicino, 'raggio': f'{raggio:g}'}, area
+    if bbox:
+        try:
+            lat1, lon1, lat2, lon2 = (float(value) for value in bbox.split(','))
+        except ValueError:
+            raise ValueError(f'Rettangolo non valido: {bbox}')
+        lat1, lat2 = sorted((lat1, lat2))
+        lon1, lon2 = sorted((lon1, lon2))
+        if not (-90 <= lat1 and lat2 <= 90 and -180 <= lon1 and lon2 <= 180):
+            raise ValueError(f'Rettangolo non valido: {bbox}')
+        # Stesso limite del raggio: il rettangolo non può superare il
+        # quadrato che contiene il cerchio di RAGGIO_MAX_KM
+        limite = 2 * RAGGIO_MAX_KM * 1000
+        altezza = (lat2 - lat1) * METRI_PER_GRADO
+        larghezza = (lon2 - lon1) * METRI_PER_GRADO * math.cos(math.radians((lat1 + lat2) / 2))
+        if altezza > limite or larghezza > limite:
+            raise ValueError(f'Rettangolo troppo grande: al massimo {2 * RAGGIO_MAX_KM} km per lato')
+        area = {'lat': (lat1 + lat2) / 2, 'lon': (lon1 + lon2) / 2, 'raggio': None,
+                'bbox': (lat1, lon1, lat2, lon2), 'precisione': 'coordinate'}
+        return {'bbox': bbox}, area
+    return {}, None
+
+def get_area_args():
+    """Area di ricerca nella richiesta, come parse_area; un luogo non riconosciuto viene segnalato e ignorato"""
+    try:
+        return parse_area(request.args)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return {}, None
+
+def area_filter(area):
+    """Condizioni e parametri che limitano gli immobili (alias i) all'area, per conteggi e faccette"""
+    if area is None:
+        return [], []
+    condition = '''i.codice IN (SELECT p.codice FROM dbSistImm_Posizioni p
+                   WHERE MBRContains(ST_GeomFromText(%s), p.posizione)'''
+    params = [bbox_wkt(area['bbox'])]
+    if area['raggio'] is not None:
+        condition += f' AND {DISTANZA_SQL} <= %s'
+        params += [point_wkt(area['lat'], area['lon']), area['raggio']]
+    return [condition + ')'], params
+
+def area_page_query(conditions, params, page, limit, after, area, columns, key):
+    """SQL e parametri per una pagina di immobili dell'area, dal più vicino (vedi immobili_page_query).
+
+    Il rettangolo dell'area seleziona le posizioni con l'indice SPATIAL
+    (MBRContains); la distanza viene calcolata solo per queste e scarta gli
+    angoli del rettangolo fuori dal raggio.
+    """
+    after = decode_cursor(after, 2)
+    offset = 0 if after is not None else (page - 1) * limit
+    conditions = ['MBRContains(ST_GeomFromText(%s), p.posizione)'] + conditions
+    params = [bbox_wkt(area['bbox'])] + params
+    outer, outer_params = [], []
+    if area['raggio'] is not None:
+        outer.append('r.distanza <= %s')
+        outer_params.append(area['raggio'])
+    if after is not None:
+        outer.append(f'(r.distanza, r.{key}) > (%s, %s)')
+        outer_params.extend(after)
+    where = f"WHERE {' AND '.join(outer)}" if outer else ''
+    return (f'''SELECT * FROM (
+            SELECT {DISTANZA_SQL} AS distanza, {columns}
+            FROM dbSistImm_Posizioni p
+            JOIN dbSistImm_Immobili i ON i.codice = p.codice
+            LEFT JOIN dbSistImm_Clienti c ON i.id_cliente = c.id_cliente
+            WHERE {' AND '.join(conditions)}
+        ) r
+        {where}
+        ORDER BY r.distanza, r.{key}
+        LIMIT %s OFFSET %s''',
+            [point_wkt(area['lat'], area['lon'])] + params + outer_params + [limit + 1, offset], ['distanza', key])
+
 # GESTIONE IMMOBILI
 
+IMMOBILI_COLUMNS = '''i.codice as id, i.indirizzo, i.civico, i.citta, i.zona, i.tipologia, 
+           i.metratura, i.anno_incarico, i.stato as disponibile, i.note as descrizione,
+           c.cognome as cliente_cognome, c.nome as cliente_nome'''
+
+IMMOBILI_FROM = '''FROM dbSistImm_Immobili i
+    LEFT JOIN dbSistImm_Clienti c ON i.id_cliente = c.id_cliente'''
+
+def immobili_filter(search_query):
+    """Condizioni WHERE, parametri ed espressione di rilevanza per la ricerca sugli immobili.
+
+    Usa gli indici FULLTEXT (migrazione 001); se la ricerca contiene solo
+    termini troppo corti per l'indice ricade sul confronto LIKE.
+    """
+    if not search_query:
+        return [], [], None, []
+    terms = fulltext_terms(search_query)
+    if terms is None:
+        search_pattern = f"%{search_query}%"
+        return ['''(i.codice LIKE %s 
+                   OR i.indirizzo LIKE %s 
+                   OR i.citta LIKE %s 
+                   OR i.zona LIKE %s 
+                   OR c.cognome LIKE %s 
+                   OR c.nome LIKE %s)'''], [search_pattern] * 6, None, []
+    conditions = ['''(MATCH(i.codice, i.indirizzo, i.citta, i.zona) AGAINST (%s IN BOOLEAN MODE)
+                   OR i.id_cliente IN (SELECT id_cliente FROM dbSistImm_Clienti
+                                       WHERE MATCH(cognome, nome) AGAINST (%s IN BOOLEAN MODE)))''']
+    rank = '''ROUND(MATCH(i.codice, i.indirizzo, i.citta, i.zona) AGAINST (%s IN BOOLEAN MODE)
+                 + COALESCE(MATCH(c.cognome, c.nome) AGAINST (%s IN BOOLEAN MODE), 0), 6)'''
+    return conditions, [terms, terms], rank, [terms, terms]
+
+def column_filters(filters):
+    """Condizioni per `filters` (colonna SQL -> valore); le colonne vanno validate dal chiamante.
+
+    Un valore (minimo, massimo) indica un intervallo con il massimo escluso;
+    None come estremo significa senza limite.
+    """
+    conditions, params = [], []
+    for column, value in (filters or {}).items():
+        if isinstance(value, tuple):
+            minimo, massimo = value
+            if minimo is not None:
+                conditions.append(f'{column} >= %s')
+                params.append(minimo)
+            if massimo is not None:
+                conditions.append(f'{column} < %s')
+                params.append(massimo)
+        else:
+            conditions.append(f'{column} = %s')
+            params.append(value)
+    return conditions, params
+
+def immobili_page_query(search_query, page, limit, after=None, filters=None,
+                        columns=IMMOBILI_COLUMNS, key='id', area=None):
+    """SQL e parametri per una pagina di immobili.
+
+    Senza ricerca ordina per codice decrescente; con la ricerca full-text
+    ordina per rilevanza; con un'area (vedi parse_area) ordina per distanza.
+    Con `after` (cursore dell'ultima riga già mostrata) usa la paginazione
+    keyset invece di scartare righe con OFFSET.
+    `columns` deve includere i.codice con alias `key`.
+    Restituisce (sql, parametri, campi del cursore).
+    """
+    conditions, params, rank, rank_params = immobili_filter(search_query)
+    extra_conditions, extra_params = column_filters(filters)
+    conditions += extra_conditions
+    params += extra_params
+    if area is not None:
+        return area_page_query(conditions, params, page, limit, after, area, columns, key)
+    after = decode_cursor(after, 1 if rank is None else 2)
+    offset = 0 if after is not None else (page - 1) * limit
+    if rank is None:
+        if after is not None:
+            conditions.append('i.codice < %s')
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return (f'''SELECT {columns} {IMMOBILI_FROM}
+            {where}
+            ORDER BY i.codice DESC
+            LIMIT %s OFFSET %s''', params + [limit + 1, offset], [key])
+    keyset = f'WHERE (r.rilevanza, r.{key}) < (%s, %s)' if after is not None else ''
+    return (f'''SELECT * FROM (
+            SELECT {rank} AS rilevanza, {columns} {IMMOBILI_FROM}
+            WHERE {' AND '.join(conditions)}
+        ) r
+        {keyset}
+        ORDER BY r.rilevanza DESC, r.{key} DESC
+        LIMIT %s OFFSET %s''', rank_params + params + (after or []) + [limit + 1, offset], ['rilevanza', key])
+
+def immobili_count_query(search_query, filters=None, area=None):
+    """SQL e parametri per contare gli immobili che soddisfano ricerca, filtri e area"""
+    conditions, params, _, _ = immobili_filter(search_query)
+    extra_conditions, extra_params = column_filters(filters)
+    area_conditions, area_params = area_filter(area)
+    conditions += extra_conditions + area_conditions
+    params += extra_params + area_params
+    if not conditions:
+        return 'SELECT COUNT(*) AS totale FROM dbSistImm_Immobili', []
+    return f'''SELECT COUNT(*) AS totale
+        {IMMOBILI_FROM}
+        WHERE {' AND '.join(conditions)}''', params
+
+def page_result(rows, limit, cursor_fields):
+    """Scarta la riga in più letta per sapere se esiste una pagina successiva e ne calcola il cursore"""
+    next_after = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_after = encode_cursor([last[field] for field in cursor_fields])
+    return rows[:limit], next_after
+
+# FILTRI A FACCETTE
+
+# Parametro della richiesta -> colonna filtrata per uguaglianza
+FACET_COLUMNS = {'tipologia': 'i.tipologia', 'stato': 'i.stato', 'citta': 'i.citta', 'zona': 'i.zona'}
+FACET_MAX_VALUES = 12  # valori mostrati per faccetta, oltre a quello selezionato
+
+# Fasce di metratura in m² (minimo incluso, massimo escluso, None = senza limite)
+METRATURA_FASCE = [(None, 50), (50, 90), (90, 150), (150, None)]
+METRATURA_FASCIA_SQL = 'CASE ' + ' '.join(
+    f"WHEN i.metratura < {massimo} THEN {index}" if massimo is not None else f"WHEN i.metratura >= {minimo} THEN {index}"
+    for index, (minimo, massimo) in enumerate(METRATURA_FASCE)) + ' END'
+
+def get_facet_args():
+    """Faccette selezionate nella richiesta: (parametri da ripetere negli URL, filtri per le query)"""
+    selected, filters = {}, {}
+    for name, column in FACET_COLUMNS.items():
+        value = request.args.get(name, '').strip()
+        if value:
+            selected[name] = value
+            filters[column] = value
+    bounds = []
+    for name in ('metratura_min', 'metratura_max'):
+        value = request.args.get(name, type=float)
+        if value is not None:
+            selected[name] = f'{value:g}'
+        bounds.append(value)
+    if bounds != [None, None]:
+        filters['i.metratura'] = tuple(bounds)
+    return selected, filters
+
+def facet_query(search_query, filters, area=None):
+    """SQL e parametri per i conteggi di tutte le faccette e il totale, con una sola query.
+
+    Ogni faccetta è contata con tutti i filtri tranne il proprio, così indica
+    quanti immobili si troverebbero cambiando solo quel valore. La riga
+    'totale' applica tutti i filtri e sostituisce il COUNT separato.
+    """
+    base_conditions, base_params, _, _ = immobili_filter(search_query)
+    source = IMMOBILI_FROM if base_conditions else 'FROM dbSistImm_Immobili i'
+    area_conditions, area_params = area_filter(area)
+    base_conditions += area_conditions
+    base_params += area_params
+    branches, params = [], []
+    facets = [(name, column, column) for name, column in FACET_COLUMNS.items()]
+    facets += [('metratura', METRATURA_FASCIA_SQL, 'i.metratura'), ('totale', 'NULL', None)]
+    for name, expression, excluded in facets:
+        conditions, extra = column_filters({column: value for column, value in filters.items() if column != excluded})
+        conditions = base_conditions + conditions
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        branches.append(f"SELECT '{name}' AS faccetta, {expression} AS valore, COUNT(*) AS totale "
+                        f"{source} {where} GROUP BY valore")
+        params += base_params + extra
+    return '\nUNION ALL\n'.join(branches), params
+
+def metratura_label(minimo, massimo):
+    """Etichetta di una fascia di metratura"""
+    if minimo is None:
+        return f'< {massimo} m²'
+    if massimo is None:
+        return f'≥ {minimo} m²'
+    return f'{minimo}–{massimo} m²'
+
+def build_facets(rows, search_query, selected, filters):
+    """Valori delle faccette con conteggio e URL (che aggiunge o toglie il filtro) e totale"""
+    def facet_url(**changes):
+        params = dict(selected, **changes)
+        return url_for('immobili', search=search_query or None,
+                       **{name: value for name, value in params.items() if value is not None})
+    
+    counts = {name: {} for name in list(FACET_COLUMNS) + ['metratura']}
+    totale = 0
+    for row in rows:
+        if row['faccetta'] == 'totale':
+            totale = row['totale']
+        elif row['faccetta'] == 'metratura':
+            if row['valore'] is not None:
+                counts['metratura'][int(row['valore'])] = row['totale']
+        elif row['valore'] is not None:
+            counts[row['faccetta']][row['valore']] = row['totale']
+    
+    facets = {}
+    for name in FACET_COLUMNS:
+        values = sorted(counts[name].items(), key=lambda item: (-item[1], item[0]))
+        current = selected.get(name)
+        shown = values[:FACET_MAX_VALUES]
+        if current is not None and current not in dict(shown):
+            shown.append((current, counts[name].get(current, 0)))
+        facets[name] = [{'valore': value, 'totale': count, 'selezionato': value == current,
+                         'url': facet_url(**{name: None if value == current else value})}
+                        for value, count in shown]
+    
+    fasce = []
+    for index, (minimo, massimo) in enumerate(METRATURA_FASCE):
+        selezionato = filters.get('i.metratura') == (minimo, massimo)
+        fasce.append({
+            'valore': metratura_label(minimo, massimo),
+            'totale': counts['metratura'].get(index, 0),
+            'selezionato': selezionato,
+            'url': facet_url(metratura_min=None if selezionato or minimo is None else f'{minimo:g}',
+                             metratura_max=None if selezionato or massimo is None else f'{massimo:g}'),
+        })
+    facets['metratura'] = fasce
+    return facets, totale
+
+def fetch_immobili_page(conn, search_query, page, limit, after=None, filters=None, area=None):
+    """Recupera una pagina di immobili e il cursore per la pagina successiva (o None)"""
+    sql, params, cursor_fields = immobili_page_query(search_query, page, limit, after, filters, area=area)
+    return page_result(conn.query(sql, params), limit, cursor_fields)
+
 @app.route('/immobili')
+@cached_page('dbSistImm_Immobili', 'dbSistImm_Clienti')
 def immobili():
-    """Visualizza la lista di tutti gli immobili"""
-    # Recupera i parametri di ricerca
+    """Visualizza la lista paginata degli immobili"""
+    # Recupera i parametri di ricerca e paginazione
     search_query = request.args.get('search', '').strip()
+    page, limit = get_pagination_args()
+    after = request.args.get('after', '').strip() or None
+    selected, filters = get_facet_args()
+    area_selected, area = get_area_args()
+    selected.update(area_selected)
     
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     if conn is None:
         flash('Errore di connessione al database!', 'error')
-        return render_template('immobili.html', immobili=[], search_query=search_query)
+        return render_template('immobili.html', immobili=[], search_query=search_query, pagination=None,
+                               filtri=selected, faccette=None, area=area)
     
     try:
-        cursor = conn.cursor(dictionary=True)  # Restituisce risultati come dizionari
-        
-        if search_query:
-            # Query di ricerca
-            search_pattern = f"%{search_query}%"
-            cursor.execute('''
-                SELECT i.codice as id, i.indirizzo, i.civico, i.citta, i.zona, i.tipologia, 
-                       i.metratura, i.anno_incarico, i.stato as disponibile, i.note as descrizione,
-                       c.cognome as cliente_cognome, c.nome as cliente_nome
-                FROM dbSistImm_Immobili i
-                LEFT JOIN dbSistImm_Clienti c ON i.id_cliente = c.id_cliente
-                WHERE i.codice LIKE %s 
-                   OR i.indirizzo LIKE %s 
-                   OR i.citta LIKE %s 
-                   OR i.zona LIKE %s 
-                   OR c.cognome LIKE %s 
-                   OR c.nome LIKE %s
-                ORDER BY i.codice DESC
-            ''', (search_pattern, search_pattern, search_pattern, search_pattern, search_pattern, search_pattern))
-        else:
-            # Query normale senza ricerca
-            cursor.execute('''
-                SELECT i.codice as id, i.indirizzo, i.civico, i.citta, i.zona, i.tipologia, 
-                       i.metratura, i.anno_incarico, i.stato as disponibile, i.note as descrizione,
-                       c.cognome as cliente_cognome, c.nome as cliente_nome
-                FROM dbSistImm_Immobili i
-                LEFT JOIN dbSistImm_Clienti c ON i.id_cliente = c.id_cliente
-                ORDER BY i.codice DESC
-            ''')
-        
-        immobili = cursor.fetchall()
-        return render_template('immobili.html', immobili=immobili, search_query=search_query)
+        # Pagina, conteggi delle faccette e totale in un solo viaggio verso il database
+        sql, params, cursor_fields = immobili_page_query(search_query, page, limit, after, filters, area=area)
+        rows, facet_rows = conn.query_batch([(sql, params), facet_query(search_query, filters, area)])
+        immobili, next_after = page_result(rows, limit, cursor_fields)
+        faccette, totale = build_facets(facet_rows, search_query, selected, filters)
+        pagination = build_pagination(page, limit, totale, next_after, after is not None)
+        return render_template('immobili.html', immobili=immobili, search_query=search_query, pagination=pagination,
+                               filtri=selected, faccette=faccette, area=area)
         
     except Error as e:
         flash(f'Errore nel recupero degli immobili: {e}', 'error')
-        return render_template('immobili.html', immobili=[], search_query=search_query)
+        return render_template('immobili.html', immobili=[], search_query=search_query, pagination=None,
+                               filtri=selected, faccette=None, area=area)
     finally:
         if conn.is_connected():
-            cursor.close()
             conn.close()
 
-@app.route('/aggiungi_immobile')
-def aggiungi_immobile():
-    """Mostra il form per aggiungere un nuovo immobile"""
-    conn = get_db_connection()
+@app.route('/immobili/scorri')
+@cached_page('dbSistImm_Immobili', 'dbSistImm_Clienti')
+def immobili_scorri():
+    """Restituisce solo le righe successive al cursore, per lo scorrimento infinito"""
+    search_query = request.args.get('search', '').strip()
+    _, limit = get_pagination_args()
+    after = request.args.get('after', '').strip() or None
+    _, filters = get_facet_args()
+    try:
+        _, area = parse_area(request.args)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    
+    conn = get_db_connection(read_only=True)
     if conn is None:
-        flash('Errore di connessione al database!', 'error')
-        return render_template('modifica_immobile.html', immobile=None, clienti=[])
+        return jsonify(error='Errore di connessione al database!'), 503
     
     try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT id_cliente, cognome, nome FROM dbSistImm_Clienti ORDER BY cognome, nome')
-        clienti = cursor.fetchall()
-        return render_template('modifica_immobile.html', immobile=None, clienti=clienti)
+        immobili, next_after = fetch_immobili_page(conn, search_query, 1, limit, after, filters, area)
+        return jsonify(html=render_template('immobili_righe.html', immobili=immobili, area=area), next=next_after)
         
     except Error as e:
-        flash(f'Errore nel recupero dei clienti: {e}', 'error')
-        return render_template('modifica_immobile.html', immobile=None, clienti=[])
+        return jsonify(error=f'Errore nel recupero degli immobili: {e}'), 500
     finally:
         if conn.is_connected():
-            cursor.close()
             conn.close()
 
+@app.route('/aggiungi_immobile')
+def aggiungi_immobile():
+    """Mostra il form per aggiungere un nuovo immobile"""
+    # I clienti vengono cercati dal form tramite /clienti/suggerimenti
+    return render_template('modifica_immobile.html', immobile=None)
+
+IMMOBILE_DETAIL_SQL = '''
+    SELECT i.codice as id, i.indirizzo, i.civico, i.citta, i.zona, i.tipologia, i.metratura, 
+           i.anno_incarico, i.stato as disponibile, i.note as descrizione, i.id_cliente, i.versione,
+           c.cognome as cliente_cognome, c.nome as cliente_nome
+    FROM dbSistImm_Immobili i
+    LEFT JOIN dbSistImm_Clienti c ON i.id_cliente = c.id_cliente
+    WHERE i.codice = %s
+'''
+
 @app.route('/modifica_immobile/<string:id>')
+@cached_page('dbSistImm_Immobili', 'dbSistImm_Clienti')
 def modifica_immobile(id):
     """Mostra il form per modificare un immobile esistente"""
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     if conn is None:
         flash('Errore di connessione al database!', 'error')
         return redirect(url_for('immobili'))
     
     try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT codice as id, indirizzo, civico, citta, zona, tipologia, metratura, anno_incarico, stato as disponibile, note as descrizione, id_cliente FROM dbSistImm_Immobili WHERE codice = %s', (id,))
-        immobile = cursor.fetchone()
+        rows = conn.query(IMMOBILE_DETAIL_SQL, (id,))
+        immobile = rows[0] if rows else None
         
         if immobile is None:
             flash('Immobile non trovato!', 'error')
             return redirect(url_for('immobili'))
         
-        # Recupera la lista dei clienti per il dropdown
-        cursor.execute('SELECT id_cliente, cognome, nome FROM dbSistImm_Clienti ORDER BY cognome, nome')
-        clienti = cursor.fetchall()
-        
-        return render_template('modifica_immobile.html', immobile=immobile, clienti=clienti)
+        return render_template('modifica_immobile.html', immobile=immobile)
         
     except Error as e:
         flash(f'Errore nel recupero dell\'immobile: {e}', 'error')
         return redirect(url_for('immobili'))
     finally:
         if conn.is_connected():
-            cursor.close()
             conn.close()
 
+IMMOBILE_FIELDS = [('indirizzo', 'Indirizzo'), ('civico', 'Civico'), ('citta', 'Città'), ('zona', 'Zona'),
+                   ('tipologia', 'Tipologia'), ('metratura', 'Metratura'), ('anno_incarico', 'Anno incarico'),
+                   ('disponibile', 'Stato'), ('id_cliente', 'Cliente'), ('descrizione', 'Note')]
+
 @app.route('/salva_immobile', methods=['POST'])
 def salva_immobile():
-    """Salva un immobile (nuovo o modificato) nel database"""
+    """Salva un immobile (nuovo o modificato) nel database.
+
+    La modifica riesce solo se l'immobile è ancora alla versione letta dal
+    form; altrimenti il form viene riproposto con il confronto tra le due versioni.
+    """
     # Recupera i dati dal form
     id_immobile = request.form.get('id')
+    versione = request.form.get('versione', type=int)
     indirizzo = request.form['indirizzo']
     civico = request.form.get('civico', '') or None
     citta = request.form['citta']
@@ -236,6 +2280,10 @@ def salva_immobile():
     if id_cliente == '':
         id_cliente = None
     
+    valori = {'codice': id_immobile, 'indirizzo': indirizzo, 'civico': civico, 'citta': citta, 'zona': zona,
+              'tipologia': tipologia, 'metratura': metratura, 'anno_incarico': anno_incarico, 'stato': stato,
+              'note': descrizione, 'id_cliente': id_cliente}
+    
     conn = get_db_connection()
     if conn is None:
         flash('Errore di connessione al database!', 'error')
@@ -249,26 +2297,47 @@ def salva_immobile():
                 UPDATE dbSistImm_Immobili 
                 SET indirizzo = %s, civico = %s, citta = %s, zona = %s, 
                     tipologia = %s, metratura = %s, anno_incarico = %s, 
-                    stato = %s, note = %s, id_cliente = %s
-                WHERE codice = %s
-            ''', (indirizzo, civico, citta, zona, tipologia, metratura, anno_incarico, stato, descrizione, id_cliente, id_immobile))
-            flash('Immobile modificato con successo!', 'success')
+                    stato = %s, note = %s, id_cliente = %s, versione = versione + 1
+                WHERE codice = %s AND versione = %s
+            ''', (indirizzo, civico, citta, zona, tipologia, metratura, anno_incarico, stato, descrizione, id_cliente, id_immobile, versione))
+            
+            if cursor.rowcount == 0:
+                # Eliminato o modificato da altri dopo l'apertura del form
+                conn.rollback()
+                rows = conn.query(IMMOBILE_DETAIL_SQL, (id_immobile,))
+                if not rows:
+                    flash('Immobile non trovato: potrebbe essere stato eliminato nel frattempo!', 'error')
+                    return redirect(url_for('immobili'))
+                saved = rows[0]
+                submitted = {'id': id_immobile, 'indirizzo': indirizzo, 'civico': civico, 'citta': citta,
+                             'zona': zona, 'tipologia': tipologia, 'metratura': metratura,
+                             'anno_incarico': anno_incarico, 'disponibile': stato, 'descrizione': descrizione,
+                             'id_cliente': id_cliente, 'cliente_cognome': '', 'cliente_nome': ''}
+                if id_cliente == saved.id_cliente:
+                    submitted.update(cliente_cognome=saved.cliente_cognome, cliente_nome=saved.cliente_nome)
+                return render_conflict('modifica_immobile.html', 'immobile', IMMOBILE_FIELDS, saved, submitted)
+            
+            log_change(cursor, 'dbSistImm_Immobili', id_immobile, 'modifica', versione + 1, valori)
+            messaggio = 'Immobile modificato con successo!'
         else:  # Nuovo immobile
             # Genera un nuovo codice per l'immobile nel formato SInnnn
-            cursor.execute("SELECT MAX(CAST(SUBSTRING(codice, 3) AS UNSIGNED)) FROM dbSistImm_Immobili WHERE codice LIKE 'SI%'")
-            result = cursor.fetchone()
-            max_num = result[0] if result[0] is not None else 0
-            nuovo_numero = max_num + 1
-            nuovo_codice = f"SI{nuovo_numero:04d}"
+            nuovo_codice = codici_immobili.next_code()
             
             cursor.execute('''
                 INSERT INTO dbSistImm_Immobili (codice, indirizzo, civico, citta, zona, 
                     tipologia, metratura, anno_incarico, stato, note, id_cliente)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             ''', (nuovo_codice, indirizzo, civico, citta, zona, tipologia, metratura, anno_incarico, stato, descrizione, id_cliente))
-            flash('Immobile aggiunto con successo!', 'success')
+            valori['codice'] = nuovo_codice
+            log_change(cursor, 'dbSistImm_Immobili', nuovo_codice, 'inserimento', 1, valori)
+            messaggio = 'Immobile aggiunto con successo!'
         
+        for query in position_queries(valori):
+            cursor.execute(*query)
+        touch_tables(cursor, 'dbSistImm_Immobili')
         conn.commit()
+        on_data_changed('dbSistImm_Immobili')
+        flash(messaggio, 'success')
         
     except Error as e:
         flash(f'Errore nel salvataggio dell\'immobile: {e}', 'error')
@@ -285,88 +2354,186 @@ def elimina_immobile(id):
     conn = get_db_connection()
     if conn is None:
         flash('Errore di connessione al database!', 'error')
-        return redirect(url_for('immobili'))
+        return redirect(url_for('immobili'))
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute(*deletion_log_query(BULK_TABLES['immobili'], id))
+        cursor.execute('DELETE FROM dbSistImm_Immobili WHERE codice = %s', (id,))
+        touch_tables(cursor, 'dbSistImm_Immobili')
+        conn.commit()
+        on_data_changed('dbSistImm_Immobili')
+        flash('Immobile eliminato con successo!', 'success')
+        
+    except Error as e:
+        flash(f'Errore nell\'eliminazione dell\'immobile: {e}', 'error')
+    finally:
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+    
+    return redirect(url_for('immobili'))
+
+# GESTIONE CLIENTI
+
+CLIENTI_FULLTEXT_COLUMNS = 'id_cliente, cognome, nome, codice_fiscale, partita_iva, telefono, email, indirizzo, citta'
+
+CLIENTI_COLUMNS = 'id_cliente, cognome, nome, codice_fiscale, partita_iva, telefono, email, indirizzo, citta, cap'
+
+def clienti_filter(search_query):
+    """Condizioni WHERE, parametri ed espressione di rilevanza per la ricerca sui clienti"""
+    if not search_query:
+        return [], [], None, []
+    terms = fulltext_terms(search_query)
+    if terms is None:
+        search_pattern = f"%{search_query}%"
+        return ['''(id_cliente LIKE %s 
+                   OR cognome LIKE %s 
+                   OR nome LIKE %s 
+                   OR codice_fiscale LIKE %s 
+                   OR partita_iva LIKE %s 
+                   OR telefono LIKE %s 
+                   OR email LIKE %s 
+                   OR indirizzo LIKE %s 
+                   OR citta LIKE %s)'''], [search_pattern] * 9, None, []
+    match = f'MATCH({CLIENTI_FULLTEXT_COLUMNS}) AGAINST (%s IN BOOLEAN MODE)'
+    return [match], [terms], f'ROUND({match}, 6)', [terms]
+
+def clienti_page_query(search_query, page, limit, after=None, filters=None, columns=CLIENTI_COLUMNS):
+    """SQL e parametri per una pagina di clienti.
+
+    Senza ricerca ordina per cognome e nome (id_cliente rende l'ordinamento
+    univoco); con la ricerca full-text ordina per rilevanza. `after` è il
+    cursore opaco dell'ultimo cliente già mostrato; `columns` deve includere
+    id_cliente, cognome e nome. Restituisce (sql, parametri, campi del cursore).
+    """
+    conditions, params, rank, rank_params = clienti_filter(search_query)
+    extra_conditions, extra_params = column_filters(filters)
+    conditions += extra_conditions
+    params += extra_params
+    after = decode_cursor(after, 3 if rank is None else 2)
+    offset = 0 if after is not None else (page - 1) * limit
+    if rank is None:
+        if after is not None:
+            conditions.append('(cognome, nome, id_cliente) > (%s, %s, %s)')
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return (f'''SELECT {columns} FROM dbSistImm_Clienti
+            {where}
+            ORDER BY cognome, nome, id_cliente
+            LIMIT %s OFFSET %s''', params + [limit + 1, offset], ['cognome', 'nome', 'id_cliente'])
+    keyset = ''
+    if after is not None:
+        keyset = 'WHERE r.rilevanza < %s OR (r.rilevanza = %s AND r.id_cliente > %s)'
+        after = [after[0], after[0], after[1]]
+    return (f'''SELECT * FROM (
+            SELECT {rank} AS rilevanza, {columns} FROM dbSistImm_Clienti
+            WHERE {' AND '.join(conditions)}
+        ) r
+        {keyset}
+        ORDER BY r.rilevanza DESC, r.id_cliente
+        LIMIT %s OFFSET %s''', rank_params + params + (after or []) + [limit + 1, offset], ['rilevanza', 'id_cliente'])
+
+def clienti_count_query(search_query, filters=None):
+    """SQL e parametri per contare i clienti che soddisfano ricerca e filtri"""
+    conditions, params, _, _ = clienti_filter(search_query)
+    extra_conditions, extra_params = column_filters(filters)
+    conditions += extra_conditions
+    params += extra_params
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return f'SELECT COUNT(*) AS totale FROM dbSistImm_Clienti {where}', params
+
+def fetch_clienti_page(conn, search_query, page, limit, after=None, filters=None):
+    """Recupera una pagina di clienti e il cursore per la pagina successiva (o None)"""
+    sql, params, cursor_fields = clienti_page_query(search_query, page, limit, after, filters)
+    return page_result(conn.query(sql, params), limit, cursor_fields)
+
+@app.route('/clienti')
+@cached_page('dbSistImm_Clienti')
+def clienti():
+    """Visualizza la lista paginata dei clienti"""
+    # Recupera i parametri di ricerca e paginazione
+    search_query = request.args.get('search', '').strip()
+    page, limit = get_pagination_args()
+    after = request.args.get('after', '').strip() or None
+    
+    conn = get_db_connection(read_only=True)
+    if conn is None:
+        flash('Errore di connessione al database!', 'error')
+        return render_template('clienti.html', clienti=[], search_query=search_query, pagination=None)
     
     try:
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM dbSistImm_Immobili WHERE codice = %s', (id,))
-        conn.commit()
-        flash('Immobile eliminato con successo!', 'success')
+        # Pagina e conteggio totale in un solo viaggio verso il database
+        sql, params, cursor_fields = clienti_page_query(search_query, page, limit, after)
+        rows, count_rows = conn.query_batch([(sql, params), clienti_count_query(search_query)])
+        clienti, next_after = page_result(rows, limit, cursor_fields)
+        totale = count_rows[0].totale
+        pagination = build_pagination(page, limit, totale, next_after, after is not None)
+        return render_template('clienti.html', clienti=clienti, search_query=search_query, pagination=pagination)
         
     except Error as e:
-        flash(f'Errore nell\'eliminazione dell\'immobile: {e}', 'error')
+        flash(f'Errore nel recupero dei clienti: {e}', 'error')
+        return render_template('clienti.html', clienti=[], search_query=search_query, pagination=None)
     finally:
         if conn.is_connected():
-            cursor.close()
             conn.close()
-    
-    return redirect(url_for('immobili'))
-
-# GESTIONE CLIENTI
 
-@app.route('/clienti')
-def clienti():
-    """Visualizza la lista di tutti i clienti"""
-    # Recupera i parametri di ricerca
+@app.route('/clienti/scorri')
+@cached_page('dbSistImm_Clienti')
+def clienti_scorri():
+    """Restituisce solo le righe successive al cursore, per lo scorrimento infinito"""
     search_query = request.args.get('search', '').strip()
+    _, limit = get_pagination_args()
+    after = request.args.get('after', '').strip() or None
     
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     if conn is None:
-        flash('Errore di connessione al database!', 'error')
-        return render_template('clienti.html', clienti=[], search_query=search_query)
+        return jsonify(error='Errore di connessione al database!'), 503
     
     try:
-        cursor = conn.cursor(dictionary=True)
-        
-        if search_query:
-            # Query di ricerca
-            search_pattern = f"%{search_query}%"
-            cursor.execute('''
-                SELECT id_cliente, cognome, nome, codice_fiscale, partita_iva, telefono, email, indirizzo, citta, cap 
-                FROM dbSistImm_Clienti 
-                WHERE id_cliente LIKE %s 
-                   OR cognome LIKE %s 
-                   OR nome LIKE %s 
-                   OR codice_fiscale LIKE %s 
-                   OR partita_iva LIKE %s 
-                   OR telefono LIKE %s 
-                   OR email LIKE %s 
-                   OR indirizzo LIKE %s 
-                   OR citta LIKE %s
-                ORDER BY cognome, nome
-            ''', (search_pattern, search_pattern, search_pattern, search_pattern, search_pattern, search_pattern, search_pattern, search_pattern, search_pattern))
-        else:
-            # Query normale senza ricerca
-            cursor.execute('SELECT id_cliente, cognome, nome, codice_fiscale, partita_iva, telefono, email, indirizzo, citta, cap FROM dbSistImm_Clienti ORDER BY cognome, nome')
-        
-        clienti = cursor.fetchall()
-        return render_template('clienti.html', clienti=clienti, search_query=search_query)
+        clienti, next_after = fetch_clienti_page(conn, search_query, 1, limit, after)
+        return jsonify(html=render_template('clienti_righe.html', clienti=clienti), next=next_after)
         
     except Error as e:
-        flash(f'Errore nel recupero dei clienti: {e}', 'error')
-        return render_template('clienti.html', clienti=[], search_query=search_query)
+        return jsonify(error=f'Errore nel recupero dei clienti: {e}'), 500
     finally:
         if conn.is_connected():
-            cursor.close()
             conn.close()
 
+@app.route('/clienti/suggerimenti')
+def clienti_suggerimenti():
+    """Suggerimenti JSON per la scelta del cliente nel form degli immobili"""
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 20, type=int) or 20, 1), PAGE_SIZE_MAX)
+    try:
+        key = shared_cache_key('nomi', 'dbSistImm_Clienti')
+        index = clienti_cache.get(key, load_client_index)
+        if index is None:
+            return jsonify(error='Errore di connessione al database!'), 503
+        return jsonify(versione=dict(key[1:]).get('dbSistImm_Clienti'), clienti=index.search(query, limit))
+        
+    except Error as e:
+        return jsonify(error=f'Errore nel recupero dei clienti: {e}'), 500
+
 @app.route('/aggiungi_cliente')
 def aggiungi_cliente():
     """Mostra il form per aggiungere un nuovo cliente"""
     return render_template('modifica_cliente.html', cliente=None)
 
-@app.route('/modifica_cliente/<int:id>')
+CLIENTE_DETAIL_SQL = 'SELECT id_cliente, cognome, nome, codice_fiscale, partita_iva, telefono, email, indirizzo, citta, cap, note, versione FROM dbSistImm_Clienti WHERE id_cliente = %s'
+
+@app.route('/modifica_cliente/<string:id>')
+@cached_page('dbSistImm_Clienti')
 def modifica_cliente(id):
     """Mostra il form per modificare un cliente esistente"""
-    conn = get_db_connection()
+    conn = get_db_connection(read_only=True)
     if conn is None:
         flash('Errore di connessione al database!', 'error')
         return redirect(url_for('clienti'))
     
     try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT id_cliente, cognome, nome, codice_fiscale, partita_iva, telefono, email, indirizzo, citta, cap, note FROM dbSistImm_Clienti WHERE id_cliente = %s', (id,))
-        cliente = cursor.fetchone()
+        rows = conn.query(CLIENTE_DETAIL_SQL, (id,))
+        cliente = rows[0] if rows else None
         
         if cliente is None:
             flash('Cliente non trovato!', 'error')
@@ -379,14 +2546,18 @@ def modifica_cliente(id):
         return redirect(url_for('clienti'))
     finally:
         if conn.is_connected():
-            cursor.close()
             conn.close()
 
+CLIENTE_FIELDS = [('cognome', 'Cognome'), ('nome', 'Nome'), ('codice_fiscale', 'Codice fiscale'),
+                  ('partita_iva', 'Partita IVA'), ('email', 'Email'), ('telefono', 'Telefono'),
+                  ('indirizzo', 'Indirizzo'), ('citta', 'Città'), ('cap', 'CAP'), ('note', 'Note')]
+
 @app.route('/salva_cliente', methods=['POST'])
 def salva_cliente():
-    """Salva un cliente (nuovo o modificato) nel database"""
+    """Salva un cliente (nuovo o modificato) nel database; le modifiche come in salva_immobile"""
     # Recupera i dati dal form
     id_cliente = request.form.get('id')
+    versione = request.form.get('versione', type=int)
     nome = request.form['nome']
     cognome = request.form['cognome']
     codice_fiscale = request.form.get('codice_fiscale', '') or None
@@ -398,6 +2569,10 @@ def salva_cliente():
     cap = request.form.get('cap', '') or None
     note = request.form.get('note', '') or None
     
+    valori = {'id_cliente': id_cliente, 'cognome': cognome, 'nome': nome, 'codice_fiscale': codice_fiscale,
+              'partita_iva': partita_iva, 'telefono': telefono, 'email': email, 'indirizzo': indirizzo,
+              'citta': citta, 'cap': cap, 'note': note}
+    
     conn = get_db_connection()
     if conn is None:
         flash('Errore di connessione al database!', 'error')
@@ -410,25 +2585,40 @@ def salva_cliente():
             cursor.execute('''
                 UPDATE dbSistImm_Clienti 
                 SET nome = %s, cognome = %s, codice_fiscale = %s, partita_iva = %s, 
-                    telefono = %s, email = %s, indirizzo = %s, citta = %s, cap = %s, note = %s
-                WHERE id_cliente = %s
-            ''', (nome, cognome, codice_fiscale, partita_iva, telefono, email, indirizzo, citta, cap, note, id_cliente))
-            flash('Cliente modificato con successo!', 'success')
+                    telefono = %s, email = %s, indirizzo = %s, citta = %s, cap = %s, note = %s,
+                    versione = versione + 1
+                WHERE id_cliente = %s AND versione = %s
+            ''', (nome, cognome, codice_fiscale, partita_iva, telefono, email, indirizzo, citta, cap, note, id_cliente, versione))
+            
+            if cursor.rowcount == 0:
+                # Eliminato o modificato da altri dopo l'apertura del form
+                conn.rollback()
+                rows = conn.query(CLIENTE_DETAIL_SQL, (id_cliente,))
+                if not rows:
+                    flash('Cliente non trovato: potrebbe essere stato eliminato nel frattempo!', 'error')
+                    return redirect(url_for('clienti'))
+                return render_conflict('modifica_cliente.html', 'cliente', CLIENTE_FIELDS, rows[0], valori)
+            
+            log_change(cursor, 'dbSistImm_Clienti', id_cliente, 'modifica', versione + 1, valori)
+            messaggio = 'Cliente modificato con successo!'
         else:  # Nuovo cliente
             # Genera il nuovo id_cliente nel formato SICnnnn
-            cursor.execute("SELECT MAX(CAST(SUBSTRING(id_cliente, 4) AS UNSIGNED)) FROM dbSistImm_Clienti WHERE id_cliente LIKE 'SIC%'")
-            max_num = cursor.fetchone()[0]
-            nuovo_numero = (max_num or 0) + 1
-            nuovo_id_cliente = f"SIC{nuovo_numero:04d}"
+            nuovo_id_cliente = codici_clienti.next_code()
             
             cursor.execute('''
                 INSERT INTO dbSistImm_Clienti (id_cliente, nome, cognome, codice_fiscale, partita_iva, 
                     telefono, email, indirizzo, citta, cap, note)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             ''', (nuovo_id_cliente, nome, cognome, codice_fiscale, partita_iva, telefono, email, indirizzo, citta, cap, note))
-            flash('Cliente aggiunto con successo!', 'success')
+            log_change(cursor, 'dbSistImm_Clienti', nuovo_id_cliente, 'inserimento', 1,
+                       dict(valori, id_cliente=nuovo_id_cliente))
+            messaggio = 'Cliente aggiunto con successo!'
         
+        # Le pagine degli immobili mostrano anche nome e cognome del cliente
+        touch_tables(cursor, 'dbSistImm_Clienti', 'dbSistImm_Immobili')
         conn.commit()
+        on_data_changed('dbSistImm_Clienti')
+        flash(messaggio, 'success')
         
     except Error as e:
         flash(f'Errore nel salvataggio del cliente: {e}', 'error')
@@ -439,7 +2629,7 @@ def salva_cliente():
     
     return redirect(url_for('clienti'))
 
-@app.route('/elimina_cliente/<int:id>')
+@app.route('/elimina_cliente/<string:id>')
 def elimina_cliente(id):
     """Elimina un cliente dal database"""
     conn = get_db_connection()
@@ -449,8 +2639,12 @@ def elimina_cliente(id):
     
     try:
         cursor = conn.cursor()
+        cursor.execute(*client_unlink_query(id))
+        cursor.execute(*deletion_log_query(BULK_TABLES['clienti'], id))
         cursor.execute('DELETE FROM dbSistImm_Clienti WHERE id_cliente = %s', (id,))
+        touch_tables(cursor, 'dbSistImm_Clienti', 'dbSistImm_Immobili')
         conn.commit()
+        on_data_changed('dbSistImm_Clienti')
         flash('Cliente eliminato con successo!', 'success')
         
     except Error as e:
@@ -462,6 +2656,691 @@ def elimina_cliente(id):
     
     return redirect(url_for('clienti'))
 
+# IMPORTAZIONE ED ESPORTAZIONE
+
+IMPORT_BATCH_SIZE = 1000    # righe per executemany/commit
+EXPORT_BATCH_SIZE = 1000    # righe lette dal server per ogni fetchmany
+IMPORT_MAX_ERRORS = 100     # errori riportati singolarmente nel resoconto
+
+BULK_TABLES = {
+    'immobili': {
+        'tabella': 'dbSistImm_Immobili',
+        'chiave': 'codice',
+        'colonne': ['codice', 'indirizzo', 'civico', 'citta', 'zona', 'tipologia',
+                    'metratura', 'anno_incarico', 'stato', 'note', 'id_cliente'],
+        'obbligatori': ['indirizzo', 'citta'],
+        'predefiniti': {'tipologia': 'Abitativo', 'stato': 'Attivo'},
+        'numerici': {'metratura': float, 'anno_incarico': int},
+        'codici': codici_immobili,
+        'tocca': ['dbSistImm_Immobili'],  # tabelle la cui versione cambia (vedi cached_page)
+        'posizioni': True,  # coordinate da aggiornare dal gazzetteer (vedi save_positions)
+    },
+    'clienti': {
+        'tabella': 'dbSistImm_Clienti',
+        'chiave': 'id_cliente',
+        'colonne': ['id_cliente', 'cognome', 'nome', 'codice_fiscale', 'partita_iva',
+                    'telefono', 'email', 'indirizzo', 'citta', 'cap', 'note'],
+        'obbligatori': ['cognome', 'nome'],
+        'predefiniti': {},
+        'numerici': {},
+        'codici': codici_clienti,
+        'tocca': ['dbSistImm_Clienti', 'dbSistImm_Immobili'],
+        'posizioni': False,
+    },
+}
+
+def read_records(lines, formato):
+    """Legge una alla volta le righe di un file CSV o JSON Lines.
+
+    Le righe JSON non valide vengono restituite come eccezione, così che
+    l'importazione possa segnalarle senza interrompersi.
+    """
+    if formato == 'csv':
+        yield from csv.DictReader(lines)
+        return
+    for line in lines:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield e
+
+def normalize_record(spec, record):
+    """Converte una riga importata nei valori delle colonne, sollevando ValueError se non valida"""
+    if not isinstance(record, dict):
+        raise ValueError(f"Riga non valida: {record}")
+    values = {}
+    for column in spec['colonne']:
+        value = record.get(column)
+        if isinstance(value, str):
+            value = value.strip()
+        if value in ('', None):
+            value = spec['predefiniti'].get(column)
+        elif column in spec['numerici']:
+            try:
+                value = spec['numerici'][column](value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Valore non numerico per {column}: {value}")
+        values[column] = value
+    missing = [column for column in spec['obbligatori'] if not values[column]]
+    if missing:
+        raise ValueError(f"Campi obbligatori mancanti: {', '.join(missing)}")
+    return values
+
+def add_import_error(report, numero, message):
+    """Registra un errore nel resoconto, riportando in dettaglio solo i primi"""
+    report['totale_errori'] += 1
+    if len(report['errori']) < IMPORT_MAX_ERRORS:
+        report['errori'].append({'riga': numero, 'errore': message})
+
+def flush_import_batch(conn, cursor, spec, batch, report):
+    """Scrive un blocco di righe con un solo executemany e un solo commit.
+
+    Le righe senza codice ricevono codici riservati in blocco. Se il blocco
+    fallisce viene riprovato riga per riga per individuare le righe errate.
+    """
+    key = spec['chiave']
+    senza_codice = [values for _, values in batch if not values[key]]
+    # Il contatore supera i codici espliciti in una transazione a sé: il lock
+    # sulla sequenza è rilasciato prima di reserve() (che usa un'altra
+    # connessione) e l'avanzamento resta valido anche se il blocco viene
+    # annullato e riprovato riga per riga
+    spec['codici'].advance(cursor, [values[key] for _, values in batch if values[key]])
+    conn.commit()
+    if senza_codice:
+        numbers = spec['codici'].reserve(len(senza_codice))
+        for values, number in zip(senza_codice, numbers):
+            values[key] = spec['codici'].format(number)
+    
+    columns = spec['colonne']
+    updates = ', '.join(f'{column} = VALUES({column})' for column in columns if column != key)
+    sql = f'''INSERT INTO {spec['tabella']} ({', '.join(columns)})
+        VALUES ({', '.join(['%s'] * len(columns))})
+        ON DUPLICATE KEY UPDATE {updates}, versione = versione + 1'''
+    params = [tuple(values[column] for column in columns) for _, values in batch]
+    # La versione risultante (1 o successiva) non è nota senza rileggere le righe
+    changes = [change_log_row(spec['tabella'], values[key], 'importazione', None, values, 'importazione')
+               for _, values in batch]
+    try:
+        cursor.executemany(sql, params)
+        cursor.executemany(CHANGE_LOG_SQL, changes)
+        if spec['posizioni']:
+            save_positions(cursor, [values for _, values in batch])
+        touch_tables(cursor, *spec['tocca'])
+        conn.commit()
+        report['importate'] += len(batch)
+    except Error:
+        conn.rollback()
+        for (numero, values), row, change in zip(batch, params, changes):
+            try:
+                cursor.execute(sql, row)
+                cursor.execute(CHANGE_LOG_SQL, change)
+                if spec['posizioni']:
+                    save_positions(cursor, [values])
+                touch_tables(cursor, *spec['tocca'])
+                conn.commit()
+                report['importate'] += 1
+            except Error as e:
+                conn.rollback()
+                add_import_error(report, numero, str(e))
+
+def import_records(nome, records, progress=None):
+    """Importa (o aggiorna, se il codice esiste già) le righe in blocchi di IMPORT_BATCH_SIZE.
+
+    `progress`, se indicato, riceve il numero di righe elaborate dopo ogni blocco.
+    """
+    spec = BULK_TABLES[nome]
+    report = {'importate': 0, 'totale_errori': 0, 'errori': []}
+    conn = get_db_connection()
+    if conn is None:
+        raise Error('Errore di connessione al database!')
+    
+    try:
+        cursor = conn.cursor()
+        batch = []
+        for numero, record in enumerate(records, start=1):
+            try:
+                batch.append((numero, normalize_record(spec, record)))
+            except ValueError as e:
+                add_import_error(report, numero, str(e))
+                continue
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush_import_batch(conn, cursor, spec, batch, report)
+                batch = []
+                if progress is not None:
+                    progress(numero)
+        if batch:
+            flush_import_batch(conn, cursor, spec, batch, report)
+        return report
+    finally:
+        if report['importate']:
+            on_data_changed(spec['tabella'])
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+
+def export_records(nome):
+    """Avvia l'esportazione e restituisce un generatore delle righe come dizionari.
+
+    Il cursore non è bufferizzato: le righe arrivano dal server a blocchi
+    di EXPORT_BATCH_SIZE e la memoria usata non dipende dal numero di righe.
+    """
+    spec = BULK_TABLES[nome]
+    conn = get_db_connection(read_only=True)
+    if conn is None:
+        raise Error('Errore di connessione al database!')
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(f"SELECT {', '.join(spec['colonne'])} FROM {spec['tabella']} ORDER BY {spec['chiave']}")
+    except Error:
+        conn.close()
+        raise
+    
+    def generate():
+        try:
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            # Se l'esportazione viene interrotta restano righe non lette:
+            # la connessione viene scartata dal pool al rilascio
+            try:
+                cursor.close()
+            except Error:
+                pass
+            conn.close()
+    
+    return generate()
+
+def json_default(value):
+    """Serializza in JSON i tipi restituiti da MySQL (Decimal, date)"""
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+def serialize_records(columns, rows, formato):
+    """Trasforma le righe in blocchi di testo CSV o JSON Lines, una riga alla volta"""
+    if formato == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+    else:
+        for row in rows:
+            yield json.dumps(row, default=json_default, ensure_ascii=False) + '\n'
+
+BULK_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+@app.route('/importa/<string:nome>', methods=['POST'])
+def importa(nome):
+    """Importa immobili o clienti da un file CSV o JSON Lines caricato nel campo 'file', in background"""
+    return crea_lavoro('importa', nome)
+
+@app.route('/esporta/<string:nome>.<string:formato>')
+def esporta(nome, formato):
+    """Esporta immobili o clienti in CSV o JSON Lines come risposta in streaming"""
+    if nome not in BULK_TABLES or formato not in BULK_FORMATS:
+        flash('Formato di esportazione non valido!', 'error')
+        return redirect(url_for('index'))
+    
+    try:
+        rows = export_records(nome)
+    except Error as e:
+        flash(f'Errore durante l\'esportazione: {e}', 'error')
+        return redirect(url_for(nome))
+    
+    body = serialize_records(BULK_TABLES[nome]['colonne'], rows, formato)
+    return Response(stream_with_context(body), mimetype=BULK_FORMATS[formato],
+                    headers={'Content-Disposition': f'attachment; filename={nome}.{formato}'})
+
+# LAVORI IN BACKGROUND
+
+# Parametri della coda (sovrascrivibili in connessione.txt). Con
+# LAVORI_WORKER=0 i processi web si limitano a mettere in coda e i lavori
+# vengono eseguiti da 'python flask_app.py lavori'.
+LAVORI_DEFAULTS = {
+    'LAVORI_WORKER': 1,           # esegue i lavori anche nei processi web
+    'LAVORI_THREADS': 2,          # lavori eseguiti contemporaneamente per processo
+    'LAVORI_POLL_SECONDS': 2,     # intervallo di controllo della coda
+    'LAVORI_LEASE_SECONDS': 300,  # senza avanzamenti per questo tempo il lavoro viene ripreso da altri
+    'LAVORI_RETRY_SECONDS': 10,   # attesa prima del primo nuovo tentativo, poi raddoppia
+}
+LAVORI_ELENCO = 50  # lavori mostrati nella pagina di stato
+
+JOB_COLUMNS = '''id, tipo, parametri, stato, tentativi, max_tentativi, fatti, totale, messaggio, risultato, errore,
+    proprietario, creato, iniziato, terminato'''
+
+def jobs_setting(key):
+    return int(DB_CONFIG.get(key, LAVORI_DEFAULTS[key]))
+
+def jobs_dir():
+    """Cartella dei file caricati e prodotti dai lavori (LAVORI_DIR), condivisa dai processi"""
+    path = DB_CONFIG.get('LAVORI_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lavori')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def job_dict(row):
+    """Lavoro come dizionario serializzabile in JSON"""
+    job = row._asdict()
+    for key in ('parametri', 'risultato'):
+        job[key] = json.loads(job[key]) if job[key] else None
+    for key in ('creato', 'iniziato', 'terminato'):
+        job[key] = job[key].isoformat() if job[key] else None
+    del job['proprietario']
+    return job
+
+def enqueue_job(tipo, parametri):
+    """Mette in coda un lavoro e ne restituisce l'id"""
+    conn = get_db_connection()
+    if conn is None:
+        raise Error('Errore di connessione al database!')
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO dbSistImm_Lavori (tipo, parametri, max_tentativi) VALUES (%s, %s, %s)',
+                       (tipo, json.dumps(parametri), JOB_TYPES[tipo]['tentativi']))
+        job_id = cursor.lastrowid
+        conn.commit()
+    finally:
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+    
+    worker = get_job_worker()
+    if worker is not None:
+        worker.wake()
+    return job_id
+
+def load_jobs(job_id=None):
+    """Un lavoro per id (lista vuota se non esiste) o gli ultimi LAVORI_ELENCO"""
+    conn = get_db_connection()
+    if conn is None:
+        raise Error('Errore di connessione al database!')
+    
+    try:
+        if job_id is not None:
+            return conn.query(f'SELECT {JOB_COLUMNS} FROM dbSistImm_Lavori WHERE id = %s', (job_id,))
+        return conn.query(f'SELECT {JOB_COLUMNS} FROM dbSistImm_Lavori ORDER BY id DESC LIMIT %s', (LAVORI_ELENCO,))
+    finally:
+        if conn.is_connected():
+            conn.close()
+
+def claim_job(owner):
+    """Prende in carico il prossimo lavoro eseguibile, o uno rimasto senza avanzamenti; None se non ce ne sono.
+
+    L'UPDATE è atomico: due processi non possono prendere lo stesso lavoro;
+    LAST_INSERT_ID(id) ne conserva l'id, come in CodeAllocator.
+    """
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''UPDATE dbSistImm_Lavori
+            SET stato = 'in_corso', proprietario = %s, tentativi = tentativi + 1, id = LAST_INSERT_ID(id),
+                iniziato = CURRENT_TIMESTAMP(6), scadenza = CURRENT_TIMESTAMP(6) + INTERVAL %s SECOND
+            WHERE (stato = 'in_coda' AND eseguibile_dal <= CURRENT_TIMESTAMP(6))
+               OR (stato = 'in_corso' AND scadenza < CURRENT_TIMESTAMP(6))
+            ORDER BY id LIMIT 1''', (owner, jobs_setting('LAVORI_LEASE_SECONDS')))
+        claimed = cursor.rowcount
+        cursor.execute('SELECT LAST_INSERT_ID()')
+        job_id = cursor.fetchone()[0]
+        conn.commit()
+        if not claimed:
+            return None
+        rows = conn.query(f'SELECT {JOB_COLUMNS} FROM dbSistImm_Lavori WHERE id = %s', (job_id,))
+        return rows[0] if rows else None
+    finally:
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+
+def update_job(job, sql, params):
+    """Aggiorna il lavoro solo se è ancora preso in carico da questo processo"""
+    conn = get_db_connection()
+    if conn is None:
+        raise Error('Errore di connessione al database!')
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'UPDATE dbSistImm_Lavori SET {sql} WHERE id = %s AND proprietario = %s',
+                       tuple(params) + (job.id, job.proprietario))
+        conn.commit()
+    finally:
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+
+class JobProgress:
+    """Registra l'avanzamento di un lavoro (al più una volta al secondo) e ne rinnova la presa in carico"""
+
+    def __init__(self, job):
+        self.job = job
+        self._last = 0
+
+    def __call__(self, fatti, totale=None, messaggio=None):
+        now = time.monotonic()
+        if now - self._last < 1 and totale is None and messaggio is None:
+            return
+        self._last = now
+        update_job(self.job, '''fatti = %s, totale = COALESCE(%s, totale), messaggio = COALESCE(%s, messaggio),
+            scadenza = CURRENT_TIMESTAMP(6) + INTERVAL %s SECOND''',
+                   (fatti, totale, messaggio, jobs_setting('LAVORI_LEASE_SECONDS')))
+
+def run_job(job):
+    """Esegue un lavoro preso in carico e ne registra il risultato, o l'errore con un eventuale nuovo tentativo"""
+    try:
+        if job.tentativi > job.max_tentativi:
+            # Ripreso dopo la scadenza: il processo che lo eseguiva si è interrotto
+            raise RuntimeError('Esecuzione interrotta e tentativi esauriti')
+        result = JOB_TYPES[job.tipo]['esegui'](json.loads(job.parametri or '{}'), JobProgress(job))
+    except Exception as e:
+        # Qualsiasi errore va registrato nel lavoro: il worker prosegue con gli altri
+        app.logger.warning(f"Lavoro {job.id} ({job.tipo}) non riuscito: {e}")
+        retry = job.tentativi < job.max_tentativi
+        delay = jobs_setting('LAVORI_RETRY_SECONDS') * 2 ** (job.tentativi - 1)
+        update_job(job, '''stato = %s, errore = %s, proprietario = NULL, scadenza = NULL,
+            eseguibile_dal = CURRENT_TIMESTAMP(6) + INTERVAL %s SECOND,
+            terminato = IF(%s, NULL, CURRENT_TIMESTAMP(6))''',
+                   ('in_coda' if retry else 'fallito', str(e), delay, retry))
+    else:
+        update_job(job, '''stato = 'completato', risultato = %s, errore = NULL, proprietario = NULL,
+            scadenza = NULL, terminato = CURRENT_TIMESTAMP(6)''',
+                   (json.dumps(result, default=json_default, ensure_ascii=False),))
+
+class JobWorker:
+    """Esegue i lavori in coda con un pool di thread del processo.
+
+    Un thread di controllo prende in carico un lavoro quando c'è un thread
+    libero; la presa in carico avviene nel database, quindi tutti i
+    processi (worker di gunicorn o il comando 'lavori') condividono la coda.
+    """
+
+    def __init__(self, threads, poll_seconds):
+        self.owner = uuid.uuid4().hex
+        self.poll_seconds = poll_seconds
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='lavori')
+        self._free = threading.Semaphore(threads)
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='lavori-coda', daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """Controlla subito la coda (dopo un nuovo inserimento)"""
+        self._wake.set()
+
+    def stop(self):
+        """Non prende altri lavori e attende quelli in corso"""
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._free.acquire()
+            try:
+                job = claim_job(self.owner)
+            except Exception as e:
+                # Il thread di controllo non deve terminare: riprova al prossimo controllo
+                app.logger.warning(f"Coda dei lavori non disponibile: {e}")
+                job = None
+            if job is None:
+                self._free.release()
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+            self._executor.submit(self._execute, job)
+
+    def _execute(self, job):
+        try:
+            run_job(job)
+        except Error as e:
+            # Esito non registrato: il lavoro verrà ripreso alla scadenza della presa in carico
+            app.logger.warning(f"Stato del lavoro {job.id} non aggiornato: {e}")
+        finally:
+            self._free.release()
+
+_jobs = None
+
+def get_job_worker():
+    """Avvia il worker dei lavori del processo al primo utilizzo (None con LAVORI_WORKER=0)"""
+    global _jobs
+    if _jobs is None and jobs_setting('LAVORI_WORKER'):
+        with _pool_lock:
+            if _jobs is None:
+                _jobs = JobWorker(jobs_setting('LAVORI_THREADS'), jobs_setting('LAVORI_POLL_SECONDS'))
+    return _jobs
+
+@app.before_request
+def start_job_worker():
+    """Ogni processo che serve richieste esegue anche i lavori in coda"""
+    if _jobs is None and DB_CONFIG:
+        get_job_worker()
+
+# Tipi di lavoro: funzione (parametri, progress) -> risultato serializzabile in JSON
+
+def bump_table_versions(*tables):
+    """Incrementa le versioni di `tables` in una transazione a sé.
+
+    Le cache in memoria sono dei singoli processi e indicizzate sulle
+    versioni (shared_cache_key, cached_page): è l'unico modo, per un lavoro
+    eseguito in un processo qualsiasi, di farle ricaricare a tutti.
+    """
+    conn = get_db_connection()
+    if conn is None:
+        raise Error('Errore di connessione al database!')
+    
+    try:
+        cursor = conn.cursor()
+        touch_tables(cursor, *tables)
+        conn.commit()
+    finally:
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+    for table in tables:
+        on_data_changed(table)
+
+def job_statistiche(parametri, progress):
+    """Fa ricalcolare le statistiche della dashboard a tutti i processi e restituisce i nuovi totali"""
+    bump_table_versions('dbSistImm_Immobili', 'dbSistImm_Clienti')
+    stats = stats_cache.get(shared_cache_key('dashboard', 'dbSistImm_Immobili', 'dbSistImm_Clienti'),
+                            load_dashboard_stats)
+    if stats is None:
+        raise Error('Errore di connessione al database!')
+    return {'immobili_totali': stats['immobili_totali'], 'clienti_totali': stats['clienti_totali']}
+
+def job_importa(parametri, progress):
+    """Importa il file caricato, poi lo elimina"""
+    path = os.path.join(jobs_dir(), parametri['file'])
+    try:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as file:
+            return import_records(parametri['nome'], read_records(file, parametri['formato']), progress)
+    finally:
+        os.remove(path)
+
+def job_esporta(parametri, progress):
+    """Esporta una tabella in un file della cartella dei lavori, scaricabile da /lavori/<id>/file"""
+    spec = BULK_TABLES[parametri['nome']]
+    conn = get_db_connection(read_only=True)
+    if conn is None:
+        raise Error('Errore di connessione al database!')
+    try:
+        totale = conn.query(f"SELECT COUNT(*) AS totale FROM {spec['tabella']}")[0].totale
+    finally:
+        if conn.is_connected():
+            conn.close()
+    progress(0, totale)
+    
+    def counted(rows):
+        for fatti, row in enumerate(rows, start=1):
+            yield row
+            progress(fatti)
+    
+    path = os.path.join(jobs_dir(), parametri['file'])
+    with open(path + '.parziale', 'w', encoding='utf-8', newline='') as file:
+        file.writelines(serialize_records(spec['colonne'], counted(export_records(parametri['nome'])),
+                                          parametri['formato']))
+    # Il file compare solo completo: un nuovo tentativo lo riscrive da capo
+    os.replace(path + '.parziale', path)
+    return {'file': parametri['file'], 'righe': totale}
+
+def job_indicizza(parametri, progress):
+    """Ricostruisce tabelle e indici full-text (OPTIMIZE TABLE) e fa ricaricare a tutti i processi l'indice dei nomi dei clienti"""
+    tables = [spec['tabella'] for spec in BULK_TABLES.values()]
+    conn = get_db_connection()
+    if conn is None:
+        raise Error('Errore di connessione al database!')
+    
+    try:
+        cursor = conn.cursor()
+        for fatti, table in enumerate(tables):
+            progress(fatti, len(tables), f'Ricostruzione di {table}')
+            cursor.execute(f'OPTIMIZE TABLE {table}')
+            cursor.fetchall()
+        progress(len(tables), len(tables), 'Completato')
+    finally:
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+    bump_table_versions('dbSistImm_Clienti')
+    return {'tabelle': tables}
+
+def job_geocodifica(parametri, progress):
+    """Ricalcola dal gazzetteer le coordinate di tutti gli immobili, a blocchi di IMPORT_BATCH_SIZE"""
+    if get_gazetteer() is None:
+        raise RuntimeError('Gazzetteer non trovato (GAZZETTEER_FILE)')
+    conn = get_db_connection()
+    if conn is None:
+        raise Error('Errore di connessione al database!')
+    
+    columns = ['codice', 'indirizzo', 'civico', 'citta', 'zona']
+    localizzati = fatti = 0
+    try:
+        cursor = conn.cursor()
+        totale = conn.query('SELECT COUNT(*) AS totale FROM dbSistImm_Immobili')[0].totale
+        progress(0, totale)
+        last = ''
+        while True:
+            rows = conn.query(f"SELECT {', '.join(columns)} FROM dbSistImm_Immobili WHERE codice > %s "
+                              f"ORDER BY codice LIMIT %s", (last, IMPORT_BATCH_SIZE))
+            if not rows:
+                break
+            localizzati += save_positions(cursor, [row._asdict() for row in rows])
+            touch_tables(cursor, 'dbSistImm_Immobili')
+            conn.commit()
+            fatti += len(rows)
+            last = rows[-1].codice
+            progress(fatti)
+    finally:
+        if fatti:
+            on_data_changed('dbSistImm_Immobili')
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+    return {'immobili': fatti, 'localizzati': localizzati}
+
+JOB_TYPES = {
+    'statistiche': {'esegui': job_statistiche, 'tentativi': 3, 'descrizione': 'Ricalcolo delle statistiche'},
+    # Un nuovo tentativo assegnerebbe altri codici alle righe senza codice già importate
+    'importa': {'esegui': job_importa, 'tentativi': 1, 'descrizione': 'Importazione'},
+    'esporta': {'esegui': job_esporta, 'tentativi': 3, 'descrizione': 'Esportazione'},
+    'indicizza': {'esegui': job_indicizza, 'tentativi': 2, 'descrizione': 'Ricostruzione degli indici di ricerca'},
+    'geocodifica': {'esegui': job_geocodifica, 'tentativi': 2, 'descrizione': 'Calcolo delle coordinate degli immobili'},
+}
+
+def job_parameters(tipo, nome):
+    """Parametri del lavoro dalla richiesta; ValueError se mancano o non sono validi"""
+    if tipo == 'importa':
+        file = request.files.get('file')
+        if nome not in BULK_TABLES or file is None or not file.filename:
+            raise ValueError('Specificare immobili o clienti e un file da importare')
+        formato = 'csv' if file.filename.lower().endswith('.csv') else 'jsonl'
+        name = f"importa-{nome}-{uuid.uuid4().hex}.{formato}"
+        # Il file viene scritto su disco a blocchi, senza caricarlo in memoria
+        file.save(os.path.join(jobs_dir(), name))
+        return {'nome': nome, 'formato': formato, 'file': name}
+    if tipo == 'esporta':
+        formato = request.form.get('formato', 'csv')
+        if nome not in BULK_TABLES or formato not in BULK_FORMATS:
+            raise ValueError('Formato di esportazione non valido!')
+        return {'nome': nome, 'formato': formato, 'file': f"esporta-{nome}-{uuid.uuid4().hex}.{formato}"}
+    return {}
+
+def crea_lavoro(tipo, nome=None):
+    """Mette in coda un lavoro: 202 con id e indirizzo dello stato per i client JSON, altrimenti torna a /lavori"""
+    wants_json = request.endpoint == 'importa' or request.accept_mimetypes.best == 'application/json'
+    try:
+        job_id = enqueue_job(tipo, job_parameters(tipo, nome))
+    except (ValueError, Error) as e:
+        status = 400 if isinstance(e, ValueError) else 500
+        if wants_json:
+            return jsonify(error=str(e)), status
+        flash(str(e), 'error')
+        return redirect(url_for('lavori'))
+    
+    status_url = url_for('stato_lavoro', job_id=job_id)
+    if wants_json:
+        return jsonify(lavoro=job_id, stato=status_url), 202, {'Location': status_url}
+    flash(f"{JOB_TYPES[tipo]['descrizione']}: lavoro n. {job_id} in coda", 'success')
+    return redirect(url_for('lavori'))
+
+@app.route('/lavori')
+def lavori():
+    """Pagina di stato degli ultimi lavori, con i comandi per avviarne di nuovi"""
+    try:
+        jobs = [job_dict(row) for row in load_jobs()]
+    except Error as e:
+        flash(f'Errore nel recupero dei lavori: {e}', 'error')
+        jobs = []
+    return render_template('lavori.html', lavori=jobs, tipi=JOB_TYPES, tabelle=list(BULK_TABLES),
+                           formati=list(BULK_FORMATS))
+
+@app.route('/lavori/<string:tipo>', methods=['POST'])
+@app.route('/lavori/<string:tipo>/<string:nome>', methods=['POST'])
+def avvia_lavoro(tipo, nome=None):
+    """Mette in coda un lavoro: statistiche, indicizza, importa/<nome>, esporta/<nome>"""
+    if tipo not in JOB_TYPES:
+        return jsonify(error=f'Tipo di lavoro sconosciuto: {tipo}'), 404
+    return crea_lavoro(tipo, nome)
+
+@app.route('/lavori/<int:job_id>')
+def stato_lavoro(job_id):
+    """Stato e avanzamento di un lavoro in JSON"""
+    try:
+        rows = load_jobs(job_id)
+    except Error as e:
+        return jsonify(error=f'Errore nel recupero del lavoro: {e}'), 500
+    if not rows:
+        return jsonify(error='Lavoro non trovato'), 404
+    return jsonify(job_dict(rows[0]))
+
+@app.route('/lavori/<int:job_id>/file')
+def file_lavoro(job_id):
+    """Scarica il file prodotto da un'esportazione completata"""
+    try:
+        rows = load_jobs(job_id)
+    except Error as e:
+        flash(f'Errore nel recupero del lavoro: {e}', 'error')
+        return redirect(url_for('lavori'))
+    job = job_dict(rows[0]) if rows else None
+    if job is None or job['tipo'] != 'esporta' or job['stato'] != 'completato':
+        flash('Nessun file disponibile per questo lavoro!', 'error')
+        return redirect(url_for('lavori'))
+    parametri = job['parametri']
+    return send_from_directory(jobs_dir(), job['risultato']['file'], as_attachment=True,
+                               download_name=f"{parametri['nome']}.{parametri['formato']}")
+
 # Route per testare la connessione al database
 @app.route('/test_connection')
 def test_connection():
@@ -482,18 +3361,243 @@ def test_connection():
                 cursor.close()
                 conn.close()
 
+@app.route('/pool_stats')
+def pool_stats():
+    """Statistiche del pool di connessioni (in uso, attese, timeout)"""
+    stats = get_pool().stats()
+    replicas = get_replicas()
+    if replicas is not None:
+        stats['repliche'] = replicas.stats()
+    return jsonify(stats)
+
+@app.route('/metrics')
+def metrics():
+    """Metriche del processo nel formato testuale di Prometheus"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    if _pool is not None:
+        for name, value in _pool.stats().items():
+            lines.append(f'# TYPE immobiliare_pool_{name} gauge')
+            lines.append(f'immobiliare_pool_{name} {value}')
+    if _replicas is not None and _replicas.replicas:
+        stats = _replicas.stats()
+        for name in next(iter(stats.values())):
+            lines.append(f'# TYPE immobiliare_replica_{name} gauge')
+            for replica, values in stats.items():
+                if values[name] is not None:
+                    lines.append(f'immobiliare_replica_{name}{format_labels([("replica", replica)])} {int(values[name])}')
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+# VERIFICA DELLO SCHEMA
+
+# Indici richiesti dalle query dell'applicazione: (tabella, colonne, uso).
+# Vanno bene tutti gli indici non FULLTEXT che iniziano con quelle colonne;
+# le migrazioni 005 e 009 creano quelli mancanti.
+REQUIRED_INDEXES = [
+    ('dbSistImm_Immobili', ('codice',), 'ricerca per codice e ordinamento della lista'),
+    ('dbSistImm_Immobili', ('id_cliente',), 'join con i clienti'),
+    ('dbSistImm_Immobili', ('stato',), 'filtro per stato'),
+    ('dbSistImm_Clienti', ('id_cliente',), 'join dagli immobili e ricerca per codice'),
+    ('dbSistImm_Clienti', ('cognome', 'nome'), 'ordinamento e paginazione della lista clienti'),
+    ('dbSistImm_Posizioni', ('posizione',), 'ricerca per distanza (indice SPATIAL, migrazione 008)'),
+]
+
+def table_indexes(cursor):
+    """Colonne degli indici non FULLTEXT del database: {tabella in minuscolo: [colonne di ogni indice]}"""
+    cursor.execute('''
+        SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND INDEX_TYPE <> 'FULLTEXT'
+        ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+    ''')
+    indexes = {}
+    for table, index, column in cursor.fetchall():
+        indexes.setdefault(table.lower(), {}).setdefault(index, []).append(column.lower())
+    return {table: list(columns.values()) for table, columns in indexes.items()}
+
+def missing_indexes(cursor):
+    """Voci di REQUIRED_INDEXES senza un indice adatto"""
+    indexes = table_indexes(cursor)
+    return [(table, columns, uso) for table, columns, uso in REQUIRED_INDEXES
+            if not any(tuple(index[:len(columns)]) == columns for index in indexes.get(table.lower(), []))]
+
+def advisor_queries():
+    """Le query delle pagine principali con parametri d'esempio, come (nome, sql, parametri)"""
+    filters = {'i.tipologia': 'Abitativo', 'i.stato': 'Disponibile', 'i.metratura': (60, 90)}
+    return [
+        ('lista immobili', *immobili_page_query('', 1, PAGE_SIZE_DEFAULT)[:2]),
+        ('lista immobili, pagina successiva',
+         *immobili_page_query('', 1, PAGE_SIZE_DEFAULT, encode_cursor(['SI9999']))[:2]),
+        ('lista immobili filtrata', *immobili_page_query('', 1, PAGE_SIZE_DEFAULT, filters=filters)[:2]),
+        ('ricerca immobili', *immobili_page_query('via roma', 1, PAGE_SIZE_DEFAULT)[:2]),
+        ('faccette immobili', *facet_query('', filters)),
+        ('immobili vicini', *immobili_page_query('', 1, PAGE_SIZE_DEFAULT, area=area_around(45.4642, 9.19, 2000))[:2]),
+        ('faccette immobili vicini', *facet_query('', {}, area_around(45.4642, 9.19, 2000))),
+        ('dettaglio immobile', IMMOBILE_DETAIL_SQL, ('SI0001',)),
+        ('lista clienti', *clienti_page_query('', 1, PAGE_SIZE_DEFAULT)[:2]),
+        ('lista clienti, pagina successiva',
+         *clienti_page_query('', 1, PAGE_SIZE_DEFAULT, encode_cursor(['Rossi', 'Mario', 'SIC0001']))[:2]),
+        ('ricerca clienti', *clienti_page_query('rossi', 1, PAGE_SIZE_DEFAULT)[:2]),
+        ('conteggio clienti', *clienti_count_query('')),
+        ('dettaglio cliente', CLIENTE_DETAIL_SQL, ('SIC0001',)),
+        ('statistiche dashboard', DASHBOARD_STATS_SQL, ()),
+    ]
+
+def explain_problems(rows):
+    """Scansioni complete e ordinamenti/tabelle temporanee nelle righe di un EXPLAIN"""
+    problems = []
+    for row in rows:
+        table = row.get('table') or ''
+        extra = row.get('Extra') or ''
+        if table.startswith('<'):
+            continue  # tabelle derivate e risultati di UNION, già valutati sulle tabelle di origine
+        if row.get('type') == 'ALL':
+            problems.append(f"scansione completa di {table} (circa {row.get('rows')} righe)")
+        if 'Using filesort' in extra:
+            problems.append(f"ordinamento senza indice (filesort) su {table}")
+        if 'Using temporary' in extra:
+            problems.append(f"tabella temporanea su {table}")
+    return problems
+
+def explain_queries(cursor):
+    """EXPLAIN di ogni query di advisor_queries(): lista di (nome, problemi)"""
+    report = []
+    for name, sql, params in advisor_queries():
+        cursor.execute(f'EXPLAIN {sql}', params)
+        columns = [column[0] for column in cursor.description]
+        report.append((name, explain_problems([dict(zip(columns, row)) for row in cursor.fetchall()])))
+    return report
+
+def report_query_plans(cursor):
+    """Stampa i piani di esecuzione problematici; restituisce il numero di problemi"""
+    totale = 0
+    for name, problems in explain_queries(cursor):
+        for problem in problems:
+            print(f"Piano di esecuzione - {name}: {problem}")
+        totale += len(problems)
+    if totale:
+        print("Nota: su tabelle con poche righe MySQL preferisce comunque la scansione completa")
+    return totale
+
+def verify_schema():
+    """Verifica completa di indici e piani di esecuzione (comando 'python flask_app.py schema')"""
+    conn = get_db_connection()
+    if conn is None:
+        print("Impossibile connettersi al database!")
+        return False
+    
+    try:
+        cursor = conn.cursor()
+        mancanti = missing_indexes(cursor)
+        for table, columns, uso in mancanti:
+            print(f"Indice mancante su {table} ({', '.join(columns)}), usato per {uso}")
+        if mancanti:
+            print("Esegui 'python flask_app.py migrate' per applicare la migrazione 005_indici_base")
+        problemi = report_query_plans(cursor)
+        if not mancanti and not problemi:
+            print("Schema verificato: tutti gli indici sono presenti e nessuna query esegue scansioni complete")
+        return not mancanti and not problemi
+        
+    except Error as e:
+        print(f"Errore durante la verifica dello schema: {e}")
+        return False
+    finally:
+        if conn.is_connected():
+            cursor.close()
+            conn.close()
+
+# AVVIO IN PRODUZIONE
+
+_app_initialized = False
+
+def create_app(config_path='connessione.txt'):
+    """Factory per i server WSGI di produzione (vedi wsgi.py e gunicorn.conf.py).
+
+    Carica la configurazione una sola volta per processo e verifica il
+    database; con il preload di gunicorn questo avviene nel processo master
+    e ogni worker crea poi il proprio pool di connessioni. DB_CONFIG può
+    essere già stato letto da gunicorn.conf.py: conta solo l'inizializzazione.
+    """
+    global _app_initialized
+    if not _app_initialized:
+        load_db_config(config_path)
+        missing_keys = missing_db_config()
+        if missing_keys:
+            raise RuntimeError(f"Parametri mancanti nel file connessione.txt: {missing_keys}")
+        app.secret_key = DB_CONFIG.get('SECRET_KEY', app.secret_key)
+        if not asset_manifest() and missing_vendor_assets():
+            # Le pagine funzionano solo se i browser raggiungono cdnjs
+            app.logger.warning(f"File vendorizzati mancanti in static/vendor: {', '.join(missing_vendor_assets())}; "
+                               "le pagine caricano Bootstrap da cdnjs. Esegui 'python flask_app.py assets scarica' "
+                               "su una macchina con accesso a internet e poi 'python flask_app.py assets'")
+        if not init_database():
+            raise RuntimeError("Impossibile inizializzare il database. Controlla la configurazione.")
+        _app_initialized = True
+    return app
+
 if __name__ == '__main__':
+    # Risorse statiche (non serve il database): 'assets scarica' aggiorna i
+    # file vendorizzati, 'assets' costruisce static/dist
+    if len(sys.argv) > 1 and sys.argv[1] == 'assets':
+        ok = download_vendor_assets() if sys.argv[2:] == ['scarica'] else build_assets()
+        exit(0 if ok else 1)
+    
     # Carica la configurazione del database
     load_db_config()
     
     # Verifica che tutti i parametri necessari siano presenti
-    required_keys = ['HOST', 'PORT', 'DATABASE', 'USERNAME', 'PASSWORD']
-    missing_keys = [key for key in required_keys if key not in DB_CONFIG]
+    missing_keys = missing_db_config()
     
     if missing_keys:
         print(f"ERRORE: Parametri mancanti nel file connessione.txt: {missing_keys}")
         exit(1)
     
+    # Comando per aggiornare lo schema del database
+    if len(sys.argv) > 1 and sys.argv[1] == 'migrate':
+        exit(0 if apply_migrations() else 1)
+    
+    # Verifica di indici e piani di esecuzione delle query principali
+    if len(sys.argv) > 1 and sys.argv[1] == 'schema':
+        exit(0 if verify_schema() else 1)
+    
+    # Esecuzione dei lavori in background in un processo dedicato
+    # (con LAVORI_WORKER=0 i processi web si limitano a metterli in coda)
+    if len(sys.argv) > 1 and sys.argv[1] == 'lavori':
+        worker = JobWorker(jobs_setting('LAVORI_THREADS'), jobs_setting('LAVORI_POLL_SECONDS'))
+        print(f"Esecuzione dei lavori in coda con {jobs_setting('LAVORI_THREADS')} thread (Ctrl+C per terminare)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            print("Attendo la fine dei lavori in corso...")
+            worker.stop()
+        exit(0)
+    
+    # Importazione/esportazione da riga di comando:
+    #   python flask_app.py importa immobili|clienti file.csv|file.jsonl
+    #   python flask_app.py esporta immobili|clienti file.csv|file.jsonl
+    if len(sys.argv) > 1 and sys.argv[1] in ('importa', 'esporta'):
+        if len(sys.argv) != 4 or sys.argv[2] not in BULK_TABLES:
+            print(f"Uso: python flask_app.py {sys.argv[1]} immobili|clienti <file.csv|file.jsonl>")
+            exit(1)
+        comando, nome, percorso = sys.argv[1:]
+        formato = 'csv' if percorso.lower().endswith('.csv') else 'jsonl'
+        try:
+            if comando == 'importa':
+                with open(percorso, 'r', encoding='utf-8-sig', newline='') as file:
+                    report = import_records(nome, read_records(file, formato))
+                print(f"Righe importate: {report['importate']}, errori: {report['totale_errori']}")
+                for errore in report['errori']:
+                    print(f"  riga {errore['riga']}: {errore['errore']}")
+            else:
+                with open(percorso, 'w', encoding='utf-8', newline='') as file:
+                    file.writelines(serialize_records(BULK_TABLES[nome]['colonne'], export_records(nome), formato))
+                print(f"Esportazione completata in {percorso}")
+        except Error as e:
+            print(f"Errore: {e}")
+            exit(1)
+        exit(0)
+    
     # Inizializza il database al primo avvio
     if init_database():
         print("✅ Database inizializzato correttamente!")
@@ -501,7 +3605,8 @@ if __name__ == '__main__':
         print(f"📊 Database: {DB_CONFIG['DATABASE']}")
         print("🚀 Avvio dell'applicazione Flask...")
         
-        # Avvia l'applicazione Flask in modalità debug
+        # Avvia l'applicazione Flask in modalità debug (solo per sviluppo:
+        # in produzione usare gunicorn -c gunicorn.conf.py wsgi:app)
         # host='0.0.0.0' permette connessioni da qualsiasi indirizzo IP
         app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
     else:
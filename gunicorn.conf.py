@@ -0,0 +1,34 @@
+"""Configurazione di gunicorn per l'esecuzione in produzione.
+
+Avvio:                        gunicorn -c gunicorn.conf.py wsgi:app
+Riavvio graduale dei worker:  kill -HUP <pid del master>
+
+I parametri si impostano in connessione.txt accanto a quelli del database:
+WSGI_BIND, WSGI_WORKERS, WSGI_THREADS. Ogni worker ha il proprio pool di
+connessioni: WSGI_THREADS non dovrebbe superare POOL_SIZE + POOL_MAX_OVERFLOW.
+"""
+import multiprocessing
+
+from flask_app import DB_CONFIG, load_db_config
+
+load_db_config()
+
+bind = DB_CONFIG.get('WSGI_BIND', '0.0.0.0:5000')
+
+# Più processi (un GIL ciascuno) con più thread per processo
+workers = int(DB_CONFIG.get('WSGI_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(DB_CONFIG.get('WSGI_THREADS', 4))
+worker_class = 'gthread'
+
+# L'applicazione viene caricata una volta nel master e condivisa dai worker
+preload_app = True
+
+# Tempo concesso alle richieste in corso durante riavvii e arresti
+graceful_timeout = 30
+timeout = 60
+
+# Ricicla periodicamente i worker per contenere eventuali perdite di memoria
+max_requests = 1000
+max_requests_jitter = 100
+
+accesslog = '-'
@@ -0,0 +1,33 @@
+-- Schema di base delle tabelle dell'applicazione, per avviare una nuova
+-- installazione (o il database di prova di benchmark/load_test.py) con
+-- 'python flask_app.py migrate'. Sui database esistenti non modifica nulla.
+
+CREATE TABLE IF NOT EXISTS dbSistImm_Clienti (
+    id_cliente VARCHAR(10) NOT NULL PRIMARY KEY,
+    cognome VARCHAR(100) NOT NULL,
+    nome VARCHAR(100) NOT NULL,
+    codice_fiscale VARCHAR(16),
+    partita_iva VARCHAR(11),
+    telefono VARCHAR(30),
+    email VARCHAR(150),
+    indirizzo VARCHAR(200),
+    citta VARCHAR(100),
+    cap VARCHAR(10),
+    note TEXT
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS dbSistImm_Immobili (
+    codice VARCHAR(10) NOT NULL PRIMARY KEY,
+    indirizzo VARCHAR(200) NOT NULL,
+    civico VARCHAR(10),
+    citta VARCHAR(100) NOT NULL,
+    zona VARCHAR(100),
+    tipologia VARCHAR(30) NOT NULL DEFAULT 'Abitativo',
+    metratura DECIMAL(10, 2),
+    anno_incarico INT,
+    stato VARCHAR(30) NOT NULL DEFAULT 'Attivo',
+    note TEXT,
+    id_cliente VARCHAR(10),
+    CONSTRAINT fk_immobili_cliente FOREIGN KEY (id_cliente)
+        REFERENCES dbSistImm_Clienti (id_cliente) ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,14 @@
+-- Indici FULLTEXT per la ricerca su immobili e clienti.
+-- Sostituiscono le scansioni complete dovute a LIKE '%testo%'.
+-- InnoDB aggiorna gli indici FULLTEXT al commit di ogni INSERT/UPDATE/DELETE.
+
+ALTER TABLE dbSistImm_Immobili
+    ADD FULLTEXT INDEX ft_immobili_ricerca (codice, indirizzo, citta, zona);
+
+-- Usato per la ricerca degli immobili per nome del cliente associato
+ALTER TABLE dbSistImm_Clienti
+    ADD FULLTEXT INDEX ft_clienti_nome (cognome, nome);
+
+ALTER TABLE dbSistImm_Clienti
+    ADD FULLTEXT INDEX ft_clienti_ricerca (id_cliente, cognome, nome, codice_fiscale, partita_iva,
+                                          telefono, email, indirizzo, citta);
@@ -0,0 +1,22 @@
+-- Contatori per la generazione dei codici SInnnn (immobili) e SICnnnn (clienti).
+-- Sostituiscono SELECT MAX(CAST(SUBSTRING(...))) a ogni inserimento, che
+-- richiedeva una scansione completa e poteva assegnare lo stesso codice a
+-- due inserimenti concorrenti.
+
+CREATE TABLE IF NOT EXISTS dbSistImm_Sequenze (
+    nome VARCHAR(50) NOT NULL PRIMARY KEY,
+    valore INT UNSIGNED NOT NULL DEFAULT 0
+) ENGINE=InnoDB;
+
+-- Inizializza i contatori dal codice più alto già presente
+INSERT INTO dbSistImm_Sequenze (nome, valore)
+SELECT 'immobili', COALESCE(MAX(CAST(SUBSTRING(codice, 3) AS UNSIGNED)), 0)
+FROM dbSistImm_Immobili
+WHERE codice LIKE 'SI%'
+ON DUPLICATE KEY UPDATE valore = GREATEST(valore, VALUES(valore));
+
+INSERT INTO dbSistImm_Sequenze (nome, valore)
+SELECT 'clienti', COALESCE(MAX(CAST(SUBSTRING(id_cliente, 4) AS UNSIGNED)), 0)
+FROM dbSistImm_Clienti
+WHERE id_cliente LIKE 'SIC%'
+ON DUPLICATE KEY UPDATE valore = GREATEST(valore, VALUES(valore));
@@ -0,0 +1,11 @@
+-- Versione dei dati di ogni tabella, incrementata nella stessa transazione
+-- di ogni modifica (vedi touch_tables in flask_app.py). Le pagine ne
+-- ricavano ETag e Last-Modified e rispondono 304 senza eseguire le query.
+
+CREATE TABLE IF NOT EXISTS dbSistImm_Versioni (
+    tabella VARCHAR(64) NOT NULL PRIMARY KEY,
+    versione BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    modificato TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
+) ENGINE=InnoDB;
+
+INSERT IGNORE INTO dbSistImm_Versioni (tabella) VALUES ('dbSistImm_Immobili'), ('dbSistImm_Clienti');
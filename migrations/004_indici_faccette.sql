@@ -0,0 +1,17 @@
+-- Indici composti per i filtri a faccette della lista immobili.
+-- InnoDB aggiunge la chiave primaria (codice) in coda a ogni indice, quindi
+-- con i filtri di uguaglianza sul prefisso anche ORDER BY codice DESC
+-- viene servito dall'indice senza filesort.
+
+-- Copre la query dei conteggi delle faccette (lettura del solo indice) e
+-- i filtri che partono da tipologia, es. Abitativo + Disponibile + Milano
+ALTER TABLE dbSistImm_Immobili
+    ADD INDEX idx_immobili_faccette (tipologia, stato, citta, zona, metratura);
+
+-- Filtri per stato senza tipologia, es. Disponibile a Milano
+ALTER TABLE dbSistImm_Immobili
+    ADD INDEX idx_immobili_stato_citta (stato, citta, zona);
+
+-- Filtri per città e zona, con l'intervallo di metratura in coda
+ALTER TABLE dbSistImm_Immobili
+    ADD INDEX idx_immobili_citta_zona (citta, zona, metratura);
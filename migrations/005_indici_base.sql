@@ -0,0 +1,54 @@
+-- Indici sulle colonne usate da join, filtri e ordinamenti (vedi
+-- REQUIRED_INDEXES in flask_app.py). Ogni indice viene creato solo se
+-- nessun indice esistente inizia già con le stesse colonne: ad esempio la
+-- chiave esterna su id_cliente ne crea uno in automatico. Gli indici
+-- FULLTEXT non contano (come in table_indexes): non servono a join e ordinamenti.
+
+SET @manca = (SELECT COUNT(*) = 0 FROM information_schema.STATISTICS
+              WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'dbSistImm_Immobili'
+                AND COLUMN_NAME = 'codice' AND SEQ_IN_INDEX = 1
+                AND INDEX_TYPE <> 'FULLTEXT');
+SET @istruzione = IF(@manca, 'ALTER TABLE dbSistImm_Immobili ADD INDEX idx_immobili_codice (codice)', 'DO 0');
+PREPARE crea_indice FROM @istruzione;
+EXECUTE crea_indice;
+DEALLOCATE PREPARE crea_indice;
+
+SET @manca = (SELECT COUNT(*) = 0 FROM information_schema.STATISTICS
+              WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'dbSistImm_Immobili'
+                AND COLUMN_NAME = 'id_cliente' AND SEQ_IN_INDEX = 1
+                AND INDEX_TYPE <> 'FULLTEXT');
+SET @istruzione = IF(@manca, 'ALTER TABLE dbSistImm_Immobili ADD INDEX idx_immobili_cliente (id_cliente)', 'DO 0');
+PREPARE crea_indice FROM @istruzione;
+EXECUTE crea_indice;
+DEALLOCATE PREPARE crea_indice;
+
+SET @manca = (SELECT COUNT(*) = 0 FROM information_schema.STATISTICS
+              WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'dbSistImm_Immobili'
+                AND COLUMN_NAME = 'stato' AND SEQ_IN_INDEX = 1
+                AND INDEX_TYPE <> 'FULLTEXT');
+SET @istruzione = IF(@manca, 'ALTER TABLE dbSistImm_Immobili ADD INDEX idx_immobili_stato (stato)', 'DO 0');
+PREPARE crea_indice FROM @istruzione;
+EXECUTE crea_indice;
+DEALLOCATE PREPARE crea_indice;
+
+SET @manca = (SELECT COUNT(*) = 0 FROM information_schema.STATISTICS
+              WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'dbSistImm_Clienti'
+                AND COLUMN_NAME = 'id_cliente' AND SEQ_IN_INDEX = 1
+                AND INDEX_TYPE <> 'FULLTEXT');
+SET @istruzione = IF(@manca, 'ALTER TABLE dbSistImm_Clienti ADD INDEX idx_clienti_id (id_cliente)', 'DO 0');
+PREPARE crea_indice FROM @istruzione;
+EXECUTE crea_indice;
+DEALLOCATE PREPARE crea_indice;
+
+-- Ordinamento e paginazione keyset della lista clienti (cognome, nome, id_cliente)
+SET @manca = (SELECT COUNT(*) = 0 FROM information_schema.STATISTICS a
+              JOIN information_schema.STATISTICS b
+                ON b.TABLE_SCHEMA = a.TABLE_SCHEMA AND b.TABLE_NAME = a.TABLE_NAME AND b.INDEX_NAME = a.INDEX_NAME
+              WHERE a.TABLE_SCHEMA = DATABASE() AND a.TABLE_NAME = 'dbSistImm_Clienti'
+                AND a.COLUMN_NAME = 'cognome' AND a.SEQ_IN_INDEX = 1
+                AND b.COLUMN_NAME = 'nome' AND b.SEQ_IN_INDEX = 2
+                AND a.INDEX_TYPE <> 'FULLTEXT');
+SET @istruzione = IF(@manca, 'ALTER TABLE dbSistImm_Clienti ADD INDEX idx_clienti_cognome_nome (cognome, nome)', 'DO 0');
+PREPARE crea_indice FROM @istruzione;
+EXECUTE crea_indice;
+DEALLOCATE PREPARE crea_indice;
@@ -0,0 +1,22 @@
+-- Concorrenza ottimistica e storico delle modifiche (vedi STORICO DELLE
+-- MODIFICHE in flask_app.py). Ogni riga ha una versione, incrementata a ogni
+-- modifica: il salvataggio di un form riesce solo se la versione è ancora
+-- quella letta, senza tenere lock sulle righe mentre l'utente compila il form.
+
+ALTER TABLE dbSistImm_Immobili ADD COLUMN versione INT UNSIGNED NOT NULL DEFAULT 1;
+
+ALTER TABLE dbSistImm_Clienti ADD COLUMN versione INT UNSIGNED NOT NULL DEFAULT 1;
+
+-- Storico in sola aggiunta, scritto nella stessa transazione della modifica.
+-- L'id crescente permette di leggere le modifiche successive a un punto noto.
+CREATE TABLE IF NOT EXISTS dbSistImm_Modifiche (
+    id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    tabella VARCHAR(64) NOT NULL,
+    chiave VARCHAR(10) NOT NULL,
+    operazione VARCHAR(20) NOT NULL,
+    versione INT UNSIGNED,
+    dati JSON,
+    origine VARCHAR(20) NOT NULL,
+    modificato TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    INDEX idx_modifiche_chiave (tabella, chiave, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,27 @@
+-- Coda dei lavori eseguiti in background (vedi LAVORI IN BACKGROUND in
+-- flask_app.py): importazioni, esportazioni, statistiche e ricostruzione
+-- degli indici di ricerca. Un lavoro viene preso in carico con un UPDATE
+-- atomico, quindi più processi possono condividere la stessa coda.
+
+CREATE TABLE IF NOT EXISTS dbSistImm_Lavori (
+    id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    tipo VARCHAR(30) NOT NULL,
+    parametri JSON,
+    stato VARCHAR(20) NOT NULL DEFAULT 'in_coda',
+    tentativi INT UNSIGNED NOT NULL DEFAULT 0,
+    max_tentativi INT UNSIGNED NOT NULL DEFAULT 1,
+    fatti BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    totale BIGINT UNSIGNED,
+    messaggio VARCHAR(255),
+    risultato JSON,
+    errore TEXT,
+    -- Presa in carico: il processo che esegue il lavoro e fino a quando
+    -- (rinnovata a ogni avanzamento; scaduta, un altro processo lo riprende)
+    proprietario VARCHAR(32),
+    scadenza TIMESTAMP(6) NULL,
+    creato TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    eseguibile_dal TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    iniziato TIMESTAMP(6) NULL,
+    terminato TIMESTAMP(6) NULL,
+    INDEX idx_lavori_stato (stato, eseguibile_dal)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,23 @@
+-- Coordinate degli immobili per la ricerca per distanza (vedi POSIZIONI E
+-- RICERCA PER DISTANZA in flask_app.py). Sono calcolate dal gazzetteer
+-- locale e tenute in una tabella a parte: l'indice SPATIAL richiede una
+-- colonna NOT NULL e non tutti gli immobili hanno un indirizzo riconosciuto.
+-- I punti sono POINT(longitudine latitudine). Su MySQL 8 la colonna deve
+-- dichiarare lo SRID, altrimenti l'ottimizzatore non usa l'indice; MySQL 5.7
+-- e MariaDB non accettano l'attributo.
+
+SET @srid = IF(VERSION() LIKE '5.%' OR VERSION() LIKE '%MariaDB%', '', ' SRID 0');
+SET @istruzione = CONCAT('CREATE TABLE IF NOT EXISTS dbSistImm_Posizioni (
+    codice VARCHAR(10) NOT NULL PRIMARY KEY,
+    latitudine DECIMAL(9,6) NOT NULL,
+    longitudine DECIMAL(9,6) NOT NULL,
+    posizione POINT NOT NULL', @srid, ',
+    precisione VARCHAR(10) NOT NULL,
+    aggiornato TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    SPATIAL INDEX idx_posizioni_posizione (posizione),
+    CONSTRAINT fk_posizioni_immobile FOREIGN KEY (codice)
+        REFERENCES dbSistImm_Immobili (codice) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4');
+PREPARE crea_tabella FROM @istruzione;
+EXECUTE crea_tabella;
+DEALLOCATE PREPARE crea_tabella;
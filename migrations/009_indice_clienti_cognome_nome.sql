@@ -0,0 +1,16 @@
+-- Nei database in cui la migrazione 005 è già stata applicata il FULLTEXT
+-- ft_clienti_nome (cognome, nome) della migrazione 001 superava il controllo
+-- e l'indice per l'ordinamento della lista clienti non veniva creato.
+-- Stesso controllo della 005, ignorando gli indici FULLTEXT.
+
+SET @manca = (SELECT COUNT(*) = 0 FROM information_schema.STATISTICS a
+              JOIN information_schema.STATISTICS b
+                ON b.TABLE_SCHEMA = a.TABLE_SCHEMA AND b.TABLE_NAME = a.TABLE_NAME AND b.INDEX_NAME = a.INDEX_NAME
+              WHERE a.TABLE_SCHEMA = DATABASE() AND a.TABLE_NAME = 'dbSistImm_Clienti'
+                AND a.COLUMN_NAME = 'cognome' AND a.SEQ_IN_INDEX = 1
+                AND b.COLUMN_NAME = 'nome' AND b.SEQ_IN_INDEX = 2
+                AND a.INDEX_TYPE <> 'FULLTEXT');
+SET @istruzione = IF(@manca, 'ALTER TABLE dbSistImm_Clienti ADD INDEX idx_clienti_cognome_nome (cognome, nome)', 'DO 0');
+PREPARE crea_indice FROM @istruzione;
+EXECUTE crea_indice;
+DEALLOCATE PREPARE crea_indice;
@@ -0,0 +1,18 @@
+"""Le route dei clienti accettano i codici alfanumerici (SICnnnn), non solo numeri"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flask_app  # noqa: E402
+
+
+def test_client_routes_match_alphanumeric_codes():
+    adapter = flask_app.app.url_map.bind('localhost')
+    assert adapter.match('/modifica_cliente/SIC0001') == ('modifica_cliente', {'id': 'SIC0001'})
+    assert adapter.match('/elimina_cliente/SIC0001') == ('elimina_cliente', {'id': 'SIC0001'})
+
+def test_client_links_are_built_from_codes():
+    with flask_app.app.test_request_context():
+        assert flask_app.url_for('modifica_cliente', id='SIC0001') == '/modifica_cliente/SIC0001'
+        assert flask_app.url_for('elimina_cliente', id='SIC0001') == '/elimina_cliente/SIC0001'
@@ -0,0 +1,8 @@
+"""Punto di ingresso WSGI per l'esecuzione in produzione.
+
+Linux:    gunicorn -c gunicorn.conf.py wsgi:app
+Windows:  waitress-serve --listen=0.0.0.0:5000 --threads=8 wsgi:app
+"""
+from flask_app import create_app
+
+app = create_app()